@@ -319,71 +319,122 @@ function initScript() {
 
     function initBookCardsEvents() {
         var bookCards = document.querySelectorAll('.book-card');
-        
+
+        // 初始化时扫一遍 DOM，把每张卡片的标签做成查找表；
+        // 之后的每次点击过滤都是 O(卡片数) 的哈希查找，
+        // 不再对每张卡片反复 querySelectorAll + 内层遍历
+        var cardTagMaps = [];
+        var cardHasTags = [];
+        // 标题/作者的小写文本也在这里缓存，搜索时每次按键不再
+        // querySelector + toLowerCase 每张卡片一遍
+        var cardTitles = [];
+        var cardAuthors = [];
+        // 拼音转换开销大，首次用到时才逐卡计算并缓存
+        var cardTitlePinyins = [];
+        var cardAuthorPinyins = [];
+        for (var ci = 0, cLen = bookCards.length; ci < cLen; ci++) {
+            var tagEls = bookCards[ci].querySelectorAll('.book-tag');
+            var tagMap = {};
+            for (var ti = 0, tLen = tagEls.length; ti < tLen; ti++) {
+                tagMap[tagEls[ti].textContent] = true;
+            }
+            cardTagMaps.push(tagMap);
+            cardHasTags.push(tagEls.length > 0);
+            cardTitles.push(bookCards[ci].querySelector('.book-title').textContent.toLowerCase());
+            cardAuthors.push(bookCards[ci].querySelector('.book-author').textContent.toLowerCase());
+            cardTitlePinyins.push(null);
+            cardAuthorPinyins.push(null);
+        }
+
+        function toPinyin(text) {
+            return pinyinPro.pinyin(text, { toneType: 'none' }).toLowerCase().replace(/ /g, '');
+        }
+
+        // 先算后写：决策阶段不碰 DOM，写入阶段只翻转类名，
+        // 读写不交错，浏览器合并成一次重排
+        function applyVisibility(shows) {
+            for (var i = 0, len = bookCards.length; i < len; i++) {
+                if (shows[i]) {
+                    bookCards[i].classList.remove('card-hidden');
+                } else {
+                    bookCards[i].classList.add('card-hidden');
+                }
+            }
+        }
+
+        function filterByTag(tagText) {
+            var shows = [];
+            for (var i = 0, len = bookCards.length; i < len; i++) {
+                if (tagText === 'All') {
+                    shows.push(true);
+                } else if (tagText === 'NoTag') {
+                    shows.push(!cardHasTags[i]);
+                } else {
+                    shows.push(cardTagMaps[i][tagText] === true);
+                }
+            }
+            applyVisibility(shows);
+        }
+
+        function activateTagCloudItem(tagText) {
+            tagCloudItems.forEach(function(t) {
+                if (t.textContent.trim() === tagText) {
+                    t.classList.add('active');
+                } else {
+                    t.classList.remove('active');
+                }
+            });
+        }
+
         searchBox.addEventListener('input', function() {
             var searchTerm = this.value.toLowerCase().trim();
-            
-            bookCards.forEach(function(card) {
-                var title = card.querySelector('.book-title').textContent.toLowerCase();
-                var author = card.querySelector('.book-author').textContent.toLowerCase();
-                
+
+            // 决策阶段：全部走初始化时缓存的文本，不读 DOM；
+            // 搜索词的拼音每次按键只算一次，卡片的拼音首次用到后复用
+            var searchPinyin = null;
+            if (searchTerm !== '' && typeof pinyinPro !== 'undefined') {
+                try {
+                    searchPinyin = toPinyin(searchTerm);
+                } catch (e) {
+                    console.log('Pinyin match error:', e);
+                }
+            }
+
+            var shows = [];
+            for (var i = 0, len = bookCards.length; i < len; i++) {
                 var match = false;
-                
+
                 if (searchTerm === '') {
                     match = true;
                 } else {
-                    var titleMatch = title.includes(searchTerm);
-                    var authorMatch = author.includes(searchTerm);
-                    
-                    var pinyinMatch = false;
-                    if (typeof pinyinPro !== 'undefined') {
+                    match = cardTitles[i].includes(searchTerm) || cardAuthors[i].includes(searchTerm);
+
+                    if (!match && searchPinyin !== null) {
                         try {
-                            var titlePinyin = pinyinPro.pinyin(title, { toneType: 'none' }).toLowerCase().replace(/ /g, '');
-                            var authorPinyin = pinyinPro.pinyin(author, { toneType: 'none' }).toLowerCase().replace(/ /g, '');
-                            var searchPinyin = pinyinPro.pinyin(searchTerm, { toneType: 'none' }).toLowerCase().replace(/ /g, '');
-                            
-                            if (titlePinyin.indexOf(searchPinyin) !== -1 || authorPinyin.indexOf(searchPinyin) !== -1) {
-                                pinyinMatch = true;
+                            if (cardTitlePinyins[i] === null) {
+                                cardTitlePinyins[i] = toPinyin(cardTitles[i]);
+                                cardAuthorPinyins[i] = toPinyin(cardAuthors[i]);
+                            }
+                            if (cardTitlePinyins[i].indexOf(searchPinyin) !== -1 || cardAuthorPinyins[i].indexOf(searchPinyin) !== -1) {
+                                match = true;
                             }
                         } catch (e) {
                             console.log('Pinyin match error:', e);
                         }
                     }
-
-                    match = titleMatch || authorMatch || pinyinMatch;
                 }
-                
-                card.style.display = match ? 'block' : 'none';
-            });
+
+                shows.push(match);
+            }
+            // 写入阶段：统一翻转类名
+            applyVisibility(shows);
         });
 
         tagCloudItems.forEach(function(tag) {
             tag.addEventListener('click', function() {
-                tagCloudItems.forEach(function(t) { t.classList.remove('active'); });
-                this.classList.add('active');
-                
                 var tagText = this.textContent.trim();
-                
-                if (tagText === 'All') {
-                    bookCards.forEach(function(card) { card.style.display = 'block'; });
-                } else if (tagText === 'NoTag') {
-                    bookCards.forEach(function(card) {
-                        var tags = card.querySelectorAll('.book-tag');
-                        var hasTag = tags.length > 0;
-                        card.style.display = hasTag ? 'none' : 'block';
-                    });
-                } else {
-                    bookCards.forEach(function(card) {
-                        var tags = card.querySelectorAll('.book-tag');
-                        var hasTag = false;
-                        
-                        tags.forEach(function(t) {
-                            if (t.textContent === tagText) hasTag = true;
-                        });
-                        
-                        card.style.display = hasTag ? 'block' : 'none';
-                    });
-                }
+                activateTagCloudItem(tagText);
+                filterByTag(tagText);
             });
         });
 
@@ -392,24 +443,10 @@ function initScript() {
             tag.addEventListener('click', function(e) {
                 e.preventDefault();
                 e.stopPropagation();
-                
+
                 var tagText = this.textContent;
-                
-                tagCloudItems.forEach(function(t) { t.classList.remove('active'); });
-                tagCloudItems.forEach(function(t) {
-                    if (t.textContent === tagText) t.classList.add('active');
-                });
-                
-                bookCards.forEach(function(card) {
-                    var tags = card.querySelectorAll('.book-tag');
-                    var hasTag = false;
-                    
-                    tags.forEach(function(t) {
-                        if (t.textContent === tagText) hasTag = true;
-                    });
-                    
-                    card.style.display = hasTag ? 'block' : 'none';
-                });
+                activateTagCloudItem(tagText);
+                filterByTag(tagText);
             });
         });
     }
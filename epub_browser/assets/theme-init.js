@@ -0,0 +1,70 @@
+// 立即应用主题，避免闪现 —— Kindle 兼容版
+// 必须以同步 <script src> 放在 <head> 中引用（不加 defer），在 body 渲染前执行
+function isKindleDevice() {
+  // 优先从 window 缓存读取
+  if (window.epubBrowserCache && window.epubBrowserCache.kindle_mode !== undefined) {
+    return window.epubBrowserCache.kindle_mode === "true";
+  }
+  // 检测设备
+  var ua = navigator.userAgent.toLowerCase();
+  var isKindle = ua.indexOf("kindle") !== -1 || ua.indexOf("silk") !== -1;
+
+  if (!window.epubBrowserCache) {
+    window.epubBrowserCache = {};
+  }
+  window.epubBrowserCache.kindle_mode = isKindle ? "true" : "false";
+  return isKindle;
+}
+
+// 通用 Cookie 方法（只定义一次）
+function getCookie(key) {
+  var cookies = document.cookie.split("; ");
+  for (var i = 0; i < cookies.length; i++) {
+    var parts = cookies[i].split("=");
+    var cookieKey = parts[0];
+    var cookieValue = parts.slice(1).join("=");
+    if (cookieKey === key) {
+      return decodeURIComponent(cookieValue);
+    }
+  }
+  return null;
+}
+
+var theme = "light";
+var isKindle = false;
+
+try {
+  // 优先从 window 缓存读取
+  var storedTheme = null;
+  if (window.epubBrowserCache && window.epubBrowserCache.theme) {
+    storedTheme = window.epubBrowserCache.theme;
+  } else {
+    storedTheme = localStorage.getItem("theme");
+    if (storedTheme) {
+      if (!window.epubBrowserCache) {
+        window.epubBrowserCache = {};
+      }
+      window.epubBrowserCache.theme = storedTheme;
+    }
+  }
+
+  if (storedTheme) {
+    theme = storedTheme;
+  } else if (isKindleDevice()) {
+    isKindle = true;
+    theme = getCookie("theme") || "light";
+  }
+} catch (e) {
+  // 捕获异常，兼容 Kindle
+  if (isKindleDevice()) {
+    isKindle = true;
+    theme = getCookie("theme") || "light";
+  }
+}
+
+// 使用 html 元素添加类名
+var htmlElement = document.documentElement;
+htmlElement.classList.add(theme + "-mode");
+if (isKindle) {
+  htmlElement.classList.add("kindle-mode");
+}
@@ -1,139 +1,151 @@
 import os
+import sys
+import stat
+import functools
+import hashlib
 import tempfile
+import threading
+
+try:
+    # C 实现的 JSON 序列化器，可选加速；未安装时回退到标准库 json
+    import orjson
+except ImportError:
+    orjson = None
 import minify_html
 import shutil
 from pathlib import Path
 from datetime import datetime
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 from .processor import EPUBProcessor
 
-class EPUBLibrary:
-    """EPUB图书馆类，管理多本书籍"""
-    
-    def __init__(self, output_dir=None):
-        self.books = {}  # 存储所有书籍信息，使用哈希作为键
-        self.file2hash = {} # 原书籍epub的 path -> book_hash
-        self.output_dir = output_dir
-        
-        # 创建基础目录
-        if output_dir is not None:
-            if os.path.exists(output_dir):
-                # 如果存在 那就存在
-                self.base_directory = output_dir
-            else:
-                try:
-                    os.mkdir(output_dir)
-                    self.base_directory = output_dir
-                except Exception:
-                    print(f"output_dir {output_dir} not exists, try to create failed, please check.")
-                    return
-        else:
-            self.base_directory = tempfile.mkdtemp(prefix='epub_library_')
+# minify 是 CPU 密集的 Rust 解析器；书籍集合不变时重复渲染的输入完全一致，
+# 按内容缓存结果让稳态下的重复调用变成 O(1)。EPUB_MINIFY=0 可整体关闭（如测试）
+_MINIFY_ENABLED = os.environ.get('EPUB_MINIFY', '1') == '1'
 
-        print(f"Library base directory: {self.base_directory}")
-    
-    def is_epub_file(self, filename):
-        suffix = filename[-5:]
-        return suffix == '.epub'
-    
-    def has_hidden_component(self, path_str):
-        """检查路径中间是否有以.开头的隐藏组件"""
-        path = Path(path_str).resolve()  # 转换为绝对路径并解析符号链接
-        parts = path.parts
-        
-        # 跳过根目录（如果是绝对路径）和最后一个组件（如果是文件）
-        # 只检查路径中间的目录组件
-        for part in parts[1:]:  # parts[0] 通常是根目录如 '/' 或 'C:\\'
-            if part.startswith('.'):
-                return True
-        return False
-    
-    def epub_file_discover(self, filename) -> list:
-        filenames = []
-        if self.is_epub_file(filename):
-            filenames.append(filename)
-            return filenames
-        if os.path.isdir(filename) and (not self.has_hidden_component(filename)):
-            cur_files = os.listdir(filename)
-            for new_filename in cur_files:
-                new_path = os.path.join(filename, new_filename)
-                cur_names = self.epub_file_discover(new_path)
-                filenames.extend(cur_names)
-        return filenames   
-    
-    def add_book(self, epub_path):
-        """添加一本书籍到图书馆"""
+@functools.lru_cache(maxsize=8)
+def _minify_cached(html):
+    return minify_html.minify(html, minify_css=True, minify_js=True)
+
+def _minify(html):
+    if not _MINIFY_ENABLED:
+        return html
+    return _minify_cached(html)
+
+def _fast_copy(src_path, dst_path):
+    """复制单个文件：目标已是最新则跳过，Linux 上走 sendfile 零拷贝
+
+    shutil.copy2 每个文件要两次 open + stat + 元数据复制；这里只同步
+    mtime（跳过检查需要），平台不支持 sendfile 时回退到 shutil.copyfile。
+    """
+    src_st = os.stat(src_path)
+    try:
+        dst_st = os.stat(dst_path)
+        if dst_st.st_size == src_st.st_size and dst_st.st_mtime >= src_st.st_mtime:
+            return
+    except OSError:
+        pass
+    # 只在 Linux 上用 sendfile：macOS/FreeBSD 虽有 os.sendfile，但输出端
+    # 必须是 socket，写普通文件会抛 ENOTSOCK（shutil 自己的快拷贝同样只认 Linux）
+    if sys.platform == 'linux' and hasattr(os, 'sendfile'):
+        src_fd = os.open(src_path, os.O_RDONLY)
         try:
-            # print(f"Adding book: {epub_path}")
-            processor = EPUBProcessor(epub_path, self.base_directory)
-            
-            # 解压EPUB
-            if not processor.extract_epub():
-                processor.cleanup()
-                return False, None
-            
-            # 解析容器文件
-            opf_path = processor.parse_container()
-            if not opf_path:
-                print(f"Unable to parse EPUB container file: {epub_path}")
-                processor.cleanup()
-                return False, None
-            
-            # 解析OPF文件
-            if not processor.parse_opf(opf_path):
-                processor.cleanup()
-                return False, None
+            dst_fd = os.open(dst_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                offset = 0
+                remaining = src_st.st_size
+                while remaining > 0:
+                    sent = os.sendfile(dst_fd, src_fd, offset, remaining)
+                    if sent == 0:
+                        break
+                    offset += sent
+                    remaining -= sent
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+    else:
+        shutil.copyfile(src_path, dst_path)
+    os.utime(dst_path, ns=(src_st.st_atime_ns, src_st.st_mtime_ns))
 
-            # 重新生成 hash
-            processor.generate_hash()
-            
-            # 创建网页界面
-            web_dir = processor.create_web_interface()
-            
-            # 存储书籍信息
-            book_info = processor.get_book_info()
-            self.books[book_info['hash']] = {
-                'temp_dir': book_info['temp_dir'],
-                'title': book_info['title'],
-                'web_dir': web_dir,
-                'cover': book_info['cover'],
-                'authors': book_info['authors'],
-                'tags': book_info['tags'],
-                'processor': processor,
-                'origin_file_path': book_info['origin_file_path']
-            }
-            self.file2hash[book_info['origin_file_path']] = book_info['hash']
-            
-            # print(f"Successfully added book: {book_info['title']} (Hash: {book_info['hash']})")
-            return True, book_info
-            
-        except Exception as e:
-            print(f"Failed to add book {epub_path}: {e}")
-            return False, None
-    
-    def add_assets(self):
-        # 复制 assets
-        BASE_DIR = os.path.dirname(os.path.realpath(__file__))
-        ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
-        assets_path = os.path.join(self.base_directory, "assets")
-        for root, dirs, files in os.walk(ASSETS_DIR):
-            for file in files:
-                src_path = os.path.join(root, file)
-                dst_path = os.path.join(assets_path, file)
-                # 确保目标目录存在
-                os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-                shutil.copy2(src_path, dst_path)
-        
-        # 复制 sw.js 到根目录（PWA 需要 Service Worker 在根目录）
-        sw_src = os.path.join(ASSETS_DIR, 'sw.js')
-        sw_dst = os.path.join(self.base_directory, 'sw.js')
-        if os.path.exists(sw_src):
-            shutil.copy2(sw_src, sw_dst)
-            
-    
-    def create_library_home(self):
-        """图书馆首页"""
-        library_html = """<!DOCTYPE html>
+def _quick_fp(epub_path):
+    """内容指纹：前 64KB + 文件大小的 blake2b
+
+    EPUB 开头是 mimetype + container + OPF，不同的书在前 64KB 内就会分叉，
+    加上文件大小足以在图书馆规模上区分内容；读 64KB 远比全量解压解析便宜。
+    读不了文件返回 None（交给正常处理路径去报错）。
+    """
+    h = hashlib.blake2b(digest_size=8)
+    try:
+        with open(epub_path, 'rb') as f:
+            h.update(f.read(65536))
+        h.update(str(os.path.getsize(epub_path)).encode())
+    except OSError:
+        return None
+    return h.hexdigest()
+
+def _parse_book(epub_path, base_directory):
+    """解压并解析一本书，返回就绪（但未生成网页）的 EPUBProcessor
+
+    解压+解析+哈希是便宜的元数据阶段；网页生成才是大头（全部章节 HTML 落盘），
+    拆开后调用方可以选择立即生成还是首次访问时再生成。失败返回 None。
+    """
+    try:
+        processor = EPUBProcessor(epub_path, base_directory)
+
+        # 解压EPUB
+        if not processor.extract_epub():
+            processor.cleanup()
+            return None
+
+        # 解析容器文件
+        opf_path = processor.parse_container()
+        if not opf_path:
+            print(f"Unable to parse EPUB container file: {epub_path}")
+            processor.cleanup()
+            return None
+
+        # 解析OPF文件
+        if not processor.parse_opf(opf_path):
+            processor.cleanup()
+            return None
+
+        # 重新生成 hash
+        processor.generate_hash()
+        return processor
+
+    except Exception as e:
+        print(f"Failed to parse book {epub_path}: {e}")
+        return None
+
+def _process_one(args):
+    """进程池 worker：在子进程中完成单本书的解压、解析和网页生成
+
+    必须是模块级函数才能被 pickle；返回可 pickle 的 book_info 字典（含 web_dir），
+    失败返回 None。
+    """
+    epub_path, base_directory = args
+    processor = _parse_book(epub_path, base_directory)
+    if processor is None:
+        return None
+    try:
+        # 创建网页界面
+        web_dir = processor.create_web_interface()
+
+        book_info = processor.get_book_info()
+        book_info['web_dir'] = web_dir
+        processor.close()
+        return book_info
+
+    except Exception as e:
+        print(f"Failed to add book {epub_path}: {e}")
+        return None
+
+
+# 图书馆首页的静态壳（head/脚手架与页尾脚本）每次渲染都不变，
+# 在模块加载时各自 minify 一次，运行时只需要处理动态的书籍/标签片段
+_LIBRARY_HEAD = """<!DOCTYPE html>
 <html lang="en">
 <head>
 <meta charset="UTF-8">
@@ -151,77 +163,9 @@ class EPUBLibrary:
 <link rel="stylesheet" href="/assets/theme.css">
 <link rel="stylesheet" href="/assets/library.css">
 <link rel="stylesheet" href="/assets/bookshelf.css">
-<script>
-// 立即应用主题，避免闪现 —— Kindle 兼容版
-function isKindleDevice() {
-  // 优先从 window 缓存读取
-  if (window.epubBrowserCache && window.epubBrowserCache.kindle_mode !== undefined) {
-    return window.epubBrowserCache.kindle_mode === "true";
-  }
-  // 检测设备
-  var ua = navigator.userAgent.toLowerCase();
-  var isKindle = ua.indexOf("kindle") !== -1 || ua.indexOf("silk") !== -1;
-  
-  if (!window.epubBrowserCache) {
-    window.epubBrowserCache = {};
-  }
-  window.epubBrowserCache.kindle_mode = isKindle ? "true" : "false";
-  return isKindle;
-}
-
-// 通用 Cookie 方法（只定义一次）
-function getCookie(key) {
-  var cookies = document.cookie.split("; ");
-  for (var i = 0; i < cookies.length; i++) {
-    var parts = cookies[i].split("=");
-    var cookieKey = parts[0];
-    var cookieValue = parts.slice(1).join("=");
-    if (cookieKey === key) {
-      return decodeURIComponent(cookieValue);
-    }
-  }
-  return null;
-}
-
-var theme = "light";
-var isKindle = false;
-
-try {
-  // 优先从 window 缓存读取
-  var storedTheme = null;
-  if (window.epubBrowserCache && window.epubBrowserCache.theme) {
-    storedTheme = window.epubBrowserCache.theme;
-  } else {
-    storedTheme = localStorage.getItem("theme");
-    if (storedTheme) {
-      if (!window.epubBrowserCache) {
-        window.epubBrowserCache = {};
-      }
-      window.epubBrowserCache.theme = storedTheme;
-    }
-  }
-
-  if (storedTheme) {
-    theme = storedTheme;
-  } else if (isKindleDevice()) {
-    isKindle = true;
-    theme = getCookie("theme") || "light";
-  }
-} catch (e) {
-  // 捕获异常，兼容 Kindle
-  if (isKindleDevice()) {
-    isKindle = true;
-    theme = getCookie("theme") || "light";
-  }
-}
-
-// 使用 html 元素添加类名
-var htmlElement = document.documentElement;
-htmlElement.classList.add(theme + "-mode");
-if (isKindle) {
-  htmlElement.classList.add("kindle-mode");
-}
-</script>
+<!-- 主题初始化脚本外置到 assets：内容在每次重建间完全相同，
+     浏览器可跨重建缓存；同步加载（不加 defer）保证 body 渲染前应用主题，避免闪现 -->
+<script src="/assets/theme-init.js"></script>
 </head>
 <body>
     <!-- 加载动画 -->
@@ -235,60 +179,8 @@ if (isKindle) {
         </div>
     </div>
 """
-        all_tags = set()
-        for book_hash, book_info in self.books.items():
-            cur_tags = book_info['tags']
-            if cur_tags:
-                for cur_tag in cur_tags:
-                    all_tags.add(cur_tag)
-
-        library_html += f"""
-    <div class="container">
-        <header class="eb-header" data-id="header">
-            <h1 style="display: flex; justify-content: center; align-items: center; text-align:center"> <img src="/assets/favicon.svg" class="theme-logo" style="width:60px; height:60px; margin-right:10px; display: flex"> <span style="display: flex">EPUB Library</span></h1>
-            <div class="stats">
-                <div class="stat-card">
-                    <i class="fas fa-book"></i>
-                    <div>
-                        <div class="stat-value">{len(self.books)} book(s)</div>
-                    </div>
-                </div>
-                <div class="stat-card">
-                    <i class="fas fa-tags"></i>
-                    <div>
-                        <div class="stat-value">{len(all_tags)} tag(s)</div>
-                    </div>
-                </div>
-
-                <div class="stat-card" id="loginCard" style="cursor: pointer;">
-                    <i class="fas fa-user"></i>
-                    <div class="stat-value" id="loginValue">Login</div>
-                </div>
-            </div>
-        </header>
-        <div class="controls" data-id="controls">
-            <div class="search-container">
-                <input type="text" class="search-box" placeholder="Search by book title, author, or tag...">
-                <i class="fas fa-search search-icon"></i>
-            </div>
-            <br/>
-            <div class="tag-cloud">
-                <div class="tag-cloud-item active" data-id="All">All</div>
-                <div class="tag-cloud-item" data-id="NoTag">NoTag</div>
-"""
-        for tag in sorted(all_tags):
-            library_html += f"""<div class="tag-cloud-item" data-id="{tag}">{tag}</div>"""
-        library_html += """
-            </div>
-        </div>"""
 
-        library_html += """
-        <div class="book-grid" data-id="book-grid">
-            <div class="book-grid-loading" id="bookGridLoading" data-id="bookGridLoading">
-                <div class="loading-spinner"></div>
-            </div>
-"""      
-        library_html += f"""
+_LIBRARY_TAIL = ("""
     </div>
     <div class="reading-controls" data-id="reading-controls">
         <button class="control-btn" id="scrollToTopBtn">
@@ -381,10 +273,9 @@ if (isKindle) {
     </div>
 </div>
 <footer class="eb-footer" data-id="eb-footer">
-    <p>EPUB Library &copy; {datetime.now().year} | Powered by <a href="https://github.com/dfface/epub-browser" target="_blank">epub-browser</a></p>
+    <p>EPUB Library &copy; """ + str(datetime.now().year) + """ | Powered by <a href="https://github.com/dfface/epub-browser" target="_blank">epub-browser</a></p>
 </footer>
-"""
-        library_html += """
+
         <script src="/assets/theme.js" defer></script>
         <script src="/assets/pinyin-pro.min.js" defer></script>
         <script src="/assets/library.js" defer></script>
@@ -456,28 +347,381 @@ if (isKindle) {
         });
         </script>
     </body>
-</html>"""
-        library_html = minify_html.minify(library_html, minify_css=True, minify_js=True)
-        with open(os.path.join(self.base_directory, 'index.html'), 'w', encoding='utf-8') as f:
-            f.write(library_html)
+</html>""")
+
+_LIBRARY_HEAD_MIN = _minify(_LIBRARY_HEAD)
+_LIBRARY_TAIL_MIN = _minify(_LIBRARY_TAIL)
+
+# 静态壳预编码成 UTF-8 字节，渲染时直接写二进制，免去文本层的逐块编码
+_LIBRARY_HEAD_MIN_B = _LIBRARY_HEAD_MIN.encode('utf-8')
+_LIBRARY_TAIL_MIN_B = _LIBRARY_TAIL_MIN.encode('utf-8')
+
+# 标签云条目的模板只编译一次，循环里用 C 实现的 str.format 填充
+_TAG_CLOUD_ITEM = '<div class="tag-cloud-item" data-id="{0}">{0}</div>'
+
+# 动态中段（头部统计 + 标签云 + book-grid 占位）以紧凑格式直接书写，
+# 标签之间没有可压缩的空白，渲染时整段绕开 minify，只做一次 format
+_HOME_MIDDLE_HEAD = (
+    '<div class="container">'
+    '<header class="eb-header" data-id="header">'
+    '<h1 style="display: flex; justify-content: center; align-items: center; text-align:center">'
+    '<img src="/assets/favicon.svg" class="theme-logo" style="width:60px; height:60px; margin-right:10px; display: flex">'
+    ' <span style="display: flex">EPUB Library</span></h1>'
+    '<div class="stats">'
+    '<div class="stat-card"><i class="fas fa-book"></i><div><div class="stat-value">{book_count} book(s)</div></div></div>'
+    '<div class="stat-card"><i class="fas fa-tags"></i><div><div class="stat-value">{tag_count} tag(s)</div></div></div>'
+    '<div class="stat-card" id="loginCard" style="cursor: pointer;"><i class="fas fa-user"></i><div class="stat-value" id="loginValue">Login</div></div>'
+    '</div>'
+    '</header>'
+    '<div class="controls" data-id="controls">'
+    '<div class="search-container">'
+    '<input type="text" class="search-box" placeholder="Search by book title, author, or tag...">'
+    '<i class="fas fa-search search-icon"></i>'
+    '</div><br/>'
+    '<div class="tag-cloud">'
+    '<div class="tag-cloud-item active" data-id="All">All</div>'
+    '<div class="tag-cloud-item" data-id="NoTag">NoTag</div>'
+)
+_HOME_MIDDLE_TAIL = (
+    '</div>'
+    '</div>'
+    '<div class="book-grid" data-id="book-grid">'
+    '<div class="book-grid-loading" id="bookGridLoading" data-id="bookGridLoading">'
+    '<div class="loading-spinner"></div>'
+    '</div>'
+)
+
+# HTML 转义走一次性的 translate 表：html.escape 是五次 str.replace，
+# 每次都整串扫描；translate 在 C 层单遍完成，结果与 html.escape 一致
+_HTML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;'})
+
+def _esc(s):
+    return s.translate(_HTML_ESCAPE)
+
+# 发现 epub 时不需要下钻的常见噪音目录（隐藏目录另由 . 前缀规则过滤）
+_DISCOVER_EXCLUDE_DIRS = frozenset({'node_modules', '__pycache__'})
+
+class EPUBLibrary:
+    """EPUB图书馆类，管理多本书籍"""
+    
+    def __init__(self, output_dir=None):
+        self.books = {}  # 存储所有书籍信息，使用哈希作为键
+        self.file2hash = {} # 原书籍epub的 path -> book_hash
+        self._all_tags = set()  # 随 add/remove 增量维护的全部标签，渲染首页时免扫描
+        self._sorted_tags = None  # sorted(self._all_tags) 的缓存，书籍变动时失效
+        self._home_dirty = True  # 书籍集合变动后才需要重写首页和元数据
+        self._fp_cache = {}  # 内容指纹 -> book_hash，重复添加同一本书时短路
+        self._pending_processors = {}  # 惰性路径：hash -> 已解析但未生成网页的 processor
+        self._build_locks = {}  # hash -> 生成锁，避免并发请求重复生成同一本书
+        # 延迟初始化锁（同 watch.py 的做法）：库实例要能整体 pickle 进
+        # watcher 子进程，threading.Lock 序列化不了
+        self.__locks_guard = None
+        self.output_dir = output_dir
         
+        # 创建基础目录
+        if output_dir is not None:
+            # exist_ok 避免 exists+mkdir 的 TOCTOU 竞态，常见情形只需一次系统调用
+            try:
+                os.makedirs(output_dir, exist_ok=True)
+                self.base_directory = output_dir
+            except OSError:
+                print(f"output_dir {output_dir} not exists, try to create failed, please check.")
+                return
+        else:
+            self.base_directory = tempfile.mkdtemp(prefix='epub_library_')
+
+        print(f"Library base directory: {self.base_directory}")
+    
+    def is_epub_file(self, filename):
+        return filename.endswith('.epub')
+    
+    def has_hidden_component(self, path_str):
+        """检查路径中间是否有以.开头的隐藏组件"""
+        path = Path(path_str).resolve()  # 转换为绝对路径并解析符号链接
+        parts = path.parts
+        
+        # 跳过根目录（如果是绝对路径）和最后一个组件（如果是文件）
+        # 只检查路径中间的目录组件
+        for part in parts[1:]:  # parts[0] 通常是根目录如 '/' 或 'C:\\'
+            if part.startswith('.'):
+                return True
+        return False
+    
+    def iter_epub_files(self, filename, exclude=_DISCOVER_EXCLUDE_DIRS):
+        """惰性发现 epub 文件，逐个 yield，不在内存里积累整张列表
+
+        隐藏目录（.git、.cache 等）和 exclude 里的噪音目录不会下钻，
+        符号链接一律不跟随，避免循环和无谓的 scandir 调用。
+        顶层路径不存在时抛 FileNotFoundError，存在性检查和发现共用同
+        一次 stat，调用方不必再单独探测。
+        """
+        if self.is_epub_file(filename):
+            if not os.path.isfile(filename):
+                raise FileNotFoundError(filename)
+            yield filename
+            return
+        try:
+            st = os.stat(filename)
+        except OSError:
+            raise FileNotFoundError(filename)
+        if not stat.S_ISDIR(st.st_mode) or self.has_hidden_component(filename):
+            return
+        # 迭代遍历代替递归，scandir 复用 dirent 缓存的类型信息，避免对每个条目额外 stat
+        stack = [filename]
+        while stack:
+            cur_dir = stack.pop()
+            try:
+                entries = os.scandir(cur_dir)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        # 隐藏文件/目录直接跳过
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in exclude:
+                            stack.append(entry.path)
+                    elif entry.name.endswith('.epub'):
+                        yield entry.path
+
+    def epub_file_discover(self, filename) -> list:
+        """兼容旧调用方的列表接口"""
+        return list(self.iter_epub_files(filename))
+    
+    def _register_book(self, book_info):
+        """把处理完毕的书籍信息登记到图书馆
+
+        标题/作者/标签在这里转义一次，后续渲染（标签云、book-metadata.json，
+        前端用 innerHTML 插入）都是纯字符串拼接，不用每次再扫一遍。
+        """
+        authors = book_info['authors']
+        tags = book_info['tags']
+        self.books[book_info['hash']] = {
+            'temp_dir': book_info['temp_dir'],
+            'title': _esc(book_info['title']),
+            'web_dir': book_info['web_dir'],
+            'cover': book_info['cover'],
+            'authors': [_esc(a) for a in authors] if authors else authors,
+            # intern：全馆的标签通常就那十几个，驻留后各书的标签列表共享同一
+            # 字符串对象，set 去重走指针相等的快路径
+            'tags': [sys.intern(_esc(t)) for t in tags] if tags else tags,
+            'origin_file_path': book_info['origin_file_path']
+        }
+        self.file2hash[book_info['origin_file_path']] = book_info['hash']
+        self._home_dirty = True
+        if tags:
+            self._all_tags.update(self.books[book_info['hash']]['tags'])
+            self._sorted_tags = None
+
+    def add_book(self, epub_path):
+        """添加一本书籍到图书馆"""
+        # print(f"Adding book: {epub_path}")
+        # 内容指纹命中说明同一本书（可能在别的路径）已经处理过，直接复用
+        fp = _quick_fp(epub_path)
+        known_hash = self._fp_cache.get(fp)
+        if known_hash is not None and known_hash in self.books:
+            self.file2hash[epub_path] = known_hash
+            return True, dict(self.books[known_hash], hash=known_hash)
+        book_info = _process_one((epub_path, self.base_directory))
+        if book_info is None:
+            return False, None
+        self._register_book(book_info)
+        if fp is not None:
+            self._fp_cache[fp] = book_info['hash']
+        # print(f"Successfully added book: {book_info['title']} (Hash: {book_info['hash']})")
+        return True, book_info
+
+    def add_book_meta(self, epub_path):
+        """只登记元数据，网页生成推迟到首次访问（惰性路径）
+
+        大库场景下大部分书可能从不会被打开，提前为每本书渲染全部章节 HTML
+        是白写的磁盘。走这条路径时 add 只需解压+解析+哈希，之后由
+        ensure_web_interface 在首次请求该书时补上网页目录。
+        注意：CLI 的批量流程仍然走 add_books 的进程池立即生成（HTTP 服务
+        在独立进程里只看文件系统，拿不到这里的 processor 对象）。
+        """
+        processor = _parse_book(epub_path, self.base_directory)
+        if processor is None:
+            return False, None
+        book_info = processor.get_book_info()
+        book_info['web_dir'] = processor.web_dir
+        self._register_book(book_info)
+        self._pending_processors[book_info['hash']] = processor
+        return True, book_info
+
+    @property
+    def _locks_guard(self):
+        """延迟初始化锁"""
+        if self.__locks_guard is None:
+            self.__locks_guard = threading.Lock()
+        return self.__locks_guard
+
+    def __getstate__(self):
+        """watcher 子进程整体 pickle 库实例时调用
+
+        线程锁和挂着打开 ZIP 句柄的待生成 processor 都序列化不了，
+        丢掉即可：子进程用到时锁会按需重建，书也会重新解析。
+        """
+        state = self.__dict__.copy()
+        state['_EPUBLibrary__locks_guard'] = None
+        state['_build_locks'] = {}
+        state['_pending_processors'] = {}
+        return state
+
+    def ensure_web_interface(self, book_hash):
+        """惰性生成某本书的网页目录；已生成则直接返回 web_dir
+
+        每个 hash 一把锁，并发请求同一本书时只有一个线程真正生成，
+        其余等待后直接复用结果。
+        """
+        if book_hash not in self._pending_processors:
+            book_info = self.books.get(book_hash)
+            return book_info['web_dir'] if book_info else None
+        with self._locks_guard:
+            lock = self._build_locks.setdefault(book_hash, threading.Lock())
+        with lock:
+            # 双重检查：拿到锁时可能已被别的线程生成
+            processor = self._pending_processors.pop(book_hash, None)
+            if processor is None:
+                return self.books[book_hash]['web_dir']
+            web_dir = processor.create_web_interface()
+            processor.close()
+            self.books[book_hash]['web_dir'] = web_dir
+        return web_dir
+
+    def build_all_now(self, max_workers=None):
+        """可选的预热：把所有待生成的网页一次性建完（惰性路径的退路）"""
+        pending = list(self._pending_processors)
+        if not pending:
+            return
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(self.ensure_web_interface, pending))
+
+    def add_books(self, epub_paths, progress_callback=None, max_workers=None):
+        """批量添加书籍，多核并行处理
+
+        每本书的解压、XML 解析、HTML 生成相互独立，扇出到进程池跑满 CPU；
+        共享状态 self.books 只在主进程根据返回值更新。返回成功添加的数量。
+        max_workers 默认取 CPU 核数；慢盘（HDD/网络盘）上被写入带宽压着时
+        调小它即可限流，不需要额外的信号量。
+        """
+        if len(epub_paths) <= 1:
+            # 单本书不值得起进程池
+            success_count = 0
+            for epub_path in epub_paths:
+                ok, _ = self.add_book(epub_path)
+                if ok:
+                    success_count += 1
+                if progress_callback:
+                    progress_callback()
+            return success_count
+
+        success_count = 0
+        # 先按内容指纹去重：同一本书出现在多个路径（或重复运行）时只处理一个代表，
+        # 其余路径在代表处理完后直接挂到同一个 hash 上
+        reps = []  # [(path, fp)]，每个指纹只进池一次
+        rep_fp = set()
+        fp_extras = {}  # fp -> 本批次里其余内容相同的路径
+        for p in epub_paths:
+            fp = _quick_fp(p)
+            known_hash = self._fp_cache.get(fp)
+            if known_hash is not None and known_hash in self.books:
+                self.file2hash[p] = known_hash
+                success_count += 1
+                if progress_callback:
+                    progress_callback()
+                continue
+            if fp is not None and fp in rep_fp:
+                fp_extras.setdefault(fp, []).append(p)
+                continue
+            if fp is not None:
+                rep_fp.add(fp)
+            reps.append((p, fp))
+
+        args = [(p, self.base_directory) for p, _ in reps]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for (epub_path, fp), book_info in zip(reps, executor.map(_process_one, args, chunksize=4)):
+                extras = fp_extras.get(fp, ())
+                if book_info is not None:
+                    self._register_book(book_info)
+                    success_count += 1
+                    if fp is not None:
+                        self._fp_cache[fp] = book_info['hash']
+                    for extra_path in extras:
+                        self.file2hash[extra_path] = book_info['hash']
+                        success_count += 1
+                if progress_callback:
+                    progress_callback()
+                    for _ in extras:
+                        progress_callback()
+        return success_count
+    
+    def add_assets(self):
+        # 复制 assets
+        BASE_DIR = os.path.dirname(os.path.realpath(__file__))
+        ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
+        assets_path = os.path.join(self.base_directory, "assets")
+        # copytree 一次搞定目录创建和遍历，并保留子目录结构
+        # （老的逐文件 walk 会把不同子目录下的同名文件拍平互相覆盖）
+        shutil.copytree(ASSETS_DIR, assets_path, dirs_exist_ok=True, copy_function=_fast_copy)
+
+        # 复制 sw.js 到根目录（PWA 需要 Service Worker 在根目录）
+        sw_src = os.path.join(ASSETS_DIR, 'sw.js')
+        sw_dst = os.path.join(self.base_directory, 'sw.js')
+        if os.path.exists(sw_src):
+            _fast_copy(sw_src, sw_dst)
+            
+    
+    def create_library_home(self):
+        """图书馆首页"""
+        # 首页内容只由书籍集合决定：集合没变且文件还在就什么都不用做
+        # （watch 模式里每个文件系统事件都会触发一次重建）
+        if not self._home_dirty and os.path.exists(os.path.join(self.base_directory, 'index.html')):
+            return
+        # 用列表累积动态片段、最后 join，避免 += 反复重新分配大字符串；
+        # 静态壳已在模块加载时 minify 好，动态中段本身就是紧凑格式，
+        # 渲染路径不再调用 minify
+        # 标签集合在 add/remove 时增量维护，这里直接取用
+        all_tags = self._all_tags
+
+        parts = [_HOME_MIDDLE_HEAD.format(book_count=len(self.books), tag_count=len(all_tags))]
+        if all_tags:
+            # 没有任何标签时跳过排序和拼接，只留下固定的 All/NoTag 按钮；
+            # 排序结果缓存到书籍变动为止，反复重建首页（如 watch 模式）不用重排
+            if self._sorted_tags is None:
+                self._sorted_tags = sorted(all_tags)
+            parts.append(''.join(_TAG_CLOUD_ITEM.format(tag) for tag in self._sorted_tags))
+        parts.append(_HOME_MIDDLE_TAIL)
+        # 分块直接写文件，不再拼接完整页面字符串，降低峰值内存；
+        # 动态部分一次性编码，静态壳用预编码字节，绕开文本 IO 的分块编码
+        with open(os.path.join(self.base_directory, 'index.html'), 'wb', buffering=1 << 20) as f:
+            f.write(_LIBRARY_HEAD_MIN_B)
+            f.write(''.join(parts).encode('utf-8'))
+            f.write(_LIBRARY_TAIL_MIN_B)
+
         self.generate_book_metadata()
+        self._home_dirty = False
     
     def generate_book_metadata(self):
         import json
-        books_data = []
-        for book_hash, book_info in self.books.items():
-            books_data.append({
-                'hash': book_hash,
-                'title': book_info['title'],
-                'authors': book_info['authors'],
-                'tags': book_info['tags'],
-                'cover': book_info['cover']
-            })
-        
+        # 列表推导式一次构建，避免循环里重复的 append 调用
+        books_data = [{
+            'hash': book_hash,
+            'title': b['title'],
+            'authors': b['authors'],
+            'tags': b['tags'],
+            'cover': b['cover']
+        } for book_hash, b in self.books.items()]
+
         metadata_path = os.path.join(self.base_directory, 'book-metadata.json')
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(books_data, f, ensure_ascii=False, separators=(',', ':'))
+        if orjson is not None:
+            # orjson 直接产出紧凑的 UTF-8 字节（等价 ensure_ascii=False + 紧凑分隔符）
+            with open(metadata_path, 'wb') as f:
+                f.write(orjson.dumps(books_data))
+        else:
+            with open(metadata_path, 'w', encoding='utf-8') as f:
+                json.dump(books_data, f, ensure_ascii=False, separators=(',', ':'))
     
     def move_book(self, book_hash):
         """按 href 的格式组织目录"""
@@ -488,14 +732,29 @@ if (isKindle) {
         old_path = book_info['web_dir']
         old_temp_dir = book_info['temp_dir']
         cur_path = os.path.join(book_path, book_hash)
+        # 幂等保护：书已在目标位置、或旧目录已不存在（watch 模式下同一次写入
+        # 往往触发多个事件，第二次 add_book 会指纹短路返回已登记的书），
+        # 此时绝不能再 rmtree 线上的 book/<hash> 目录
+        if old_path == cur_path or not os.path.exists(old_path):
+            return
         try:
             shutil.rmtree(cur_path, ignore_errors=True) # 删掉原来的文件，避免进入子目录
         except Exception as e:
             pass
+        moved = False
         try:
-            shutil.move(old_path, cur_path)
-        except Exception as e:
-            print(f"move {old_path} to {cur_path} failed, err: {e}")
+            # 同一文件系统内一次 rename 即可，不走 shutil.move 的拷贝回退逻辑
+            os.replace(old_path, cur_path)
+            moved = True
+        except OSError:
+            try:
+                shutil.move(old_path, cur_path)
+                moved = True
+            except Exception as e:
+                print(f"move {old_path} to {cur_path} failed, err: {e}")
+        if moved:
+            # 登记信息跟随新位置，后续指纹短路返回的就是搬运后的目录
+            book_info['web_dir'] = cur_path
         try:
             # 删除原来的 temp_dir 目录
             shutil.rmtree(old_temp_dir)
@@ -509,6 +768,10 @@ if (isKindle) {
             try:
                 shutil.rmtree(cur_path)
                 self.books.pop(book_hash)
+                # 删除是低频路径，直接全量重建标签集合
+                self._all_tags = {t for b in self.books.values() for t in (b.get('tags') or ())}
+                self._sorted_tags = None
+                self._home_dirty = True
             except Exception as e:
                 print(f"remove {cur_path} failed, err: {e}")
 
@@ -516,47 +779,60 @@ if (isKindle) {
         """按照 href 的格式组织目录"""
         # 创建 book 目录
         book_path = os.path.join(self.base_directory, "book")
-        if os.path.exists(book_path):
-            try:
-                shutil.rmtree(book_path)
-                os.mkdir(book_path)
-            except Exception as e:
-                print(f"book_path {book_path} exists, try to recreate failed, err: {e}")
-        else:
-            os.mkdir(book_path)
+        shutil.rmtree(book_path, ignore_errors=True)
+        try:
+            os.makedirs(book_path, exist_ok=True)
+        except OSError as e:
+            print(f"book_path {book_path} exists, try to recreate failed, err: {e}")
         # 把所有书籍移动到对应目录
-        for book_hash, book_info in self.books.items():
-            old_path = book_info['web_dir']
-            old_temp_dir = book_info['temp_dir']
-            cur_path = os.path.join(book_path, book_hash)
-            try:
-                shutil.move(old_path, cur_path)
-                # 删除原来的 temp_dir 目录
-                shutil.rmtree(old_temp_dir)
-            except Exception as e:
-                print(f"move {old_path} to {cur_path} failed, err: {e}")
+        # web_dir 和目标都在 base_directory 下（同一文件系统），os.replace 是单个原子
+        # rename 系统调用；temp_dir 的删除交给线程池，和后续 rename 并行执行
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for book_hash, book_info in self.books.items():
+                old_path = book_info['web_dir']
+                old_temp_dir = book_info['temp_dir']
+                cur_path = os.path.join(book_path, book_hash)
+                try:
+                    os.replace(old_path, cur_path)
+                except OSError:
+                    # 万一 base_directory 被挂到不同文件系统，回退到拷贝语义
+                    try:
+                        shutil.move(old_path, cur_path)
+                    except Exception as e:
+                        print(f"move {old_path} to {cur_path} failed, err: {e}")
+                        continue
+                # 登记信息跟随新位置，watch 模式下后续事件不会再拿到过期路径
+                book_info['web_dir'] = cur_path
+                pool.submit(shutil.rmtree, old_temp_dir, ignore_errors=True)
     
     def cleanup(self):
         """清理所有文件"""
         if self.output_dir is not None:
             # 用户自己的目录，不要一个全删
-            for book_hash, book_info in self.books.items():
-                temp_dir = book_info['temp_dir']
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                    print(f"Cleaned up book: {book_info['title']}, path: {temp_dir}")
+            # rmtree 是深度递归的 unlink+rmdir，耗时在系统调用延迟上，
+            # 用线程池并发删除多本书的目录
+            def _cleanup_book(item):
+                book_hash, book_info = item
                 middle_dir = os.path.join(self.output_dir,f"epub_{book_hash}") # 可能存在的中间文件
-                if os.path.exists(middle_dir):
-                    shutil.rmtree(middle_dir, ignore_errors=True)
-                    print(f"Cleaned up book: {book_info['title']}, path: {middle_dir}")
-            if os.path.exists(os.path.join(self.output_dir, "index.html")):
-                os.remove(os.path.join(self.output_dir, "index.html"))
-            if os.path.exists(os.path.join(self.output_dir, "sw.js")):
-                os.remove(os.path.join(self.output_dir, "sw.js"))
-            if os.path.exists(os.path.join(self.output_dir, "assets")):
-                shutil.rmtree(os.path.join(self.output_dir, "assets"), ignore_errors=True)
-            if os.path.exists(os.path.join(self.output_dir, "book")):
-                shutil.rmtree(os.path.join(self.output_dir, "book"), ignore_errors=True)
+                for cur_dir in (book_info['temp_dir'], middle_dir):
+                    # EAFP：直接删，目录不存在就当删过了，省一次 stat
+                    try:
+                        shutil.rmtree(cur_dir)
+                        print(f"Cleaned up book: {book_info['title']}, path: {cur_dir}")
+                    except FileNotFoundError:
+                        pass
+                    except OSError:
+                        pass
+
+            with ThreadPoolExecutor(max_workers=min(32, len(self.books) or 1)) as pool:
+                list(pool.map(_cleanup_book, self.books.items()))
+                for filename in ("index.html", "sw.js"):
+                    try:
+                        os.remove(os.path.join(self.output_dir, filename))
+                    except FileNotFoundError:
+                        pass
+                pool.submit(shutil.rmtree, os.path.join(self.output_dir, "assets"), ignore_errors=True)
+                pool.submit(shutil.rmtree, os.path.join(self.output_dir, "book"), ignore_errors=True)
             print(f"Cleaned up files inside library base directory: {self.base_directory}")
             return
         else:
@@ -7,10 +7,8 @@ EPUB to Web Converter
 
 import os
 import sys
-import threading
 import multiprocessing
 import signal
-from concurrent.futures import ThreadPoolExecutor
 import argparse
 from tqdm import tqdm
 from watchdog.observers import Observer
@@ -53,51 +51,23 @@ def main():
     
     args = parser.parse_args()
     
-    # 检查文件是否存在
-    for filename in args.filename:
-        if not os.path.exists(filename):
-            print(f"Error: File '{filename}' does not exist")
-            sys.exit(1)
-    
     # 创建图书馆
     library = EPUBLibrary(args.output_dir)
 
-    # 收集所有的 epub file，可能传递了路径需要下钻
+    # 收集所有的 epub file，可能传递了路径需要下钻；
+    # 存在性检查由发现过程顺带完成，不再提前单独 stat 一轮
     real_epub_files = []
     for filename in args.filename:
-        cur_files = library.epub_file_discover(filename)
+        try:
+            cur_files = library.epub_file_discover(filename)
+        except FileNotFoundError:
+            print(f"Error: File '{filename}' does not exist")
+            sys.exit(1)
         real_epub_files.extend(cur_files)
 
-    # 添加所有书籍
-    # 线程安全相关变量
-    success_count = 0
-    count_lock = threading.Lock()  # 保证计数器操作的原子性
-    progress_lock = threading.Lock()  # 保证 tqdm 进度条显示正常
-
-    # 创建进度条（总任务数为文件数量）
+    # 添加所有书籍，进程池多核并行，进度条在主进程更新
     pbar = tqdm(total=len(real_epub_files), desc="Processing books")
-
-    # 多线程处理函数：添加单本书籍
-    def add_book_thread(filename, pbar):
-        nonlocal success_count
-        # 调用 add_book 添加书籍（假设该方法线程安全，若不安全需额外加锁）
-        result, book_info = library.add_book(filename)
-        # 线程安全地更新计数器和进度条
-        with count_lock:
-            if result:
-                success_count += 1
-        with progress_lock:
-            pbar.update(1)  # 每次处理完一本书，更新进度条
-
-    # 创建并启动线程
-    with ThreadPoolExecutor(max_workers=10) as executor:  # 限制最大10个并发线程
-        futures = []
-        for filename in real_epub_files:
-            # 使用线程池提交任务
-            future = executor.submit(add_book_thread, filename, pbar)
-            futures.append(future)
-    
-    # 关闭进度条
+    success_count = library.add_books(real_epub_files, progress_callback=lambda: pbar.update(1))
     pbar.close()
 
     if success_count == 0:
@@ -161,20 +131,15 @@ def main():
         if watcher_process:
             processes.append(watcher_process)
 
-        while True:
+        # stop_event.wait 在事件触发时立刻醒来，否则阻塞睡满超时，
+        # 比固定 sleep 轮询少一个数量级的无谓唤醒
+        while not stop_event.is_set():
             # 检查进程是否存活
             alive_processes = [p for p in processes if p.is_alive()]
             if not alive_processes:
                 print("All processes have terminated")
                 break
-                
-            # 检查停止事件
-            if stop_event.is_set():
-                break
-                
-            # 短暂休眠避免过度占用CPU
-            import time
-            time.sleep(0.1)
+            stop_event.wait(timeout=1.0)
                 
     except KeyboardInterrupt:
         print("\nShutting down...")
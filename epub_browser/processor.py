@@ -3,7 +3,20 @@ import zipfile
 import tempfile
 import shutil
 import xml.etree.ElementTree as ET
+
+try:
+    # libxml2 后端的解析器，解析 OPF/NCX 比纯 expat + Python 元素对象快数倍；
+    # find/findall/fromstring/parse 接口与标准库兼容，未安装时回退标准库
+    from lxml import etree as XET
+    # EPUB 内容不可信：关闭实体解析与网络访问，防 XXE/实体炸弹；
+    # lxml 的解析器可跨调用复用，也省去每次 parse 重建解析器的开销
+    _XML_PARSER = XET.XMLParser(resolve_entities=False, no_network=True)
+except ImportError:
+    XET = ET
+    # 标准库 ElementTree 默认不解析外部实体，且解析器一次性，传 None 即可
+    _XML_PARSER = None
 import re
+import posixpath
 import hashlib
 import base64
 import json
@@ -12,6 +25,241 @@ import minify_html
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# XML 命名空间与常用标签名：模块加载时构建一次，解析热路径直接引用，
+# 不在每次调用里重建同样的字典和 Clark 记法字符串
+CONTAINER_NS = {'ns': 'urn:oasis:names:tc:opendocument:xmlns:container'}
+OPF_NS = {'opf': 'http://www.idpf.org/2007/opf',
+          'dc': 'http://purl.org/dc/elements/1.1/'}
+OPF_ITEM = '{%s}item' % OPF_NS['opf']
+OPF_META = '{%s}meta' % OPF_NS['opf']
+OPF_SPINE = '{%s}spine' % OPF_NS['opf']
+DC_TITLE = '{%s}title' % OPF_NS['dc']
+DC_CREATOR = '{%s}creator' % OPF_NS['dc']
+DC_SUBJECT = '{%s}subject' % OPF_NS['dc']
+DC_DESCRIPTION = '{%s}description' % OPF_NS['dc']
+DC_LANGUAGE = '{%s}language' % OPF_NS['dc']
+NCX_NS = 'http://www.daisy.org/z3986/2005/ncx/'
+NCX_NAVPOINT = '{%s}navPoint' % NCX_NS
+NCX_TEXT = '{%s}text' % NCX_NS
+NCX_CONTENT = '{%s}content' % NCX_NS
+
+# 封面文件名的启发式匹配：一次编译，替代逐模式的子串扫描
+_COVER_RE = re.compile(r'cover|titlepage', re.IGNORECASE)
+
+def _fast_join_norm(base, href):
+    """os.path.normpath(os.path.join(base, href)) 的快路径
+
+    manifest/NCX 里的 href 绝大多数是干净的相对路径，直接拼接即可；
+    normpath 每次都要完整切分重组路径，只在出现 .. / . / 反斜杠、
+    多余斜杠这类少数情况时才回退去调它。结果与原写法逐字节相同。
+    """
+    if ('..' in href or './' in href or '\\' in href or '//' in href
+            or href.startswith('/') or href.endswith('/')):
+        return os.path.normpath(os.path.join(base, href))
+    return base + '/' + href if base else href
+
+def _iterparse(source):
+    """NCX 流式解析入口：lxml 与标准库的 iterparse 安全参数写法不同，
+    统一在这里带上 start/end 事件并关闭实体解析"""
+    if _XML_PARSER is not None:
+        return XET.iterparse(source, events=('start', 'end'), resolve_entities=False)
+    return XET.iterparse(source, events=('start', 'end'))
+
+# 书籍索引页的固定骨架：常量部分在模块加载时压缩一次（Kindle 兼容，
+# 不压缩 css/js），create_index_page 只负责填入动态内容，整页不再逐书
+# 过一遍 minify_html。动态模板本身写成紧凑单行，插值后即为成品。
+_BOOK_INDEX_HEAD = """<!DOCTYPE html>
+<html lang="{lang}">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <meta name="theme-color" content="#4a90d9">
+    <meta name="description" content="{title} - EPUB Browser">
+    <meta name="apple-mobile-web-app-capable" content="yes">
+    <meta name="apple-mobile-web-app-status-bar-style" content="default">
+    <meta name="apple-mobile-web-app-title" content="EPUB Browser">
+    <title>{title}</title>
+    <link rel="stylesheet" href="/assets/fa.all.min.css">
+    <link rel="stylesheet" href="/assets/theme.css">
+    <link rel="stylesheet" href="/assets/book.css">
+    <link rel="icon" type="image/svg+xml" href="/assets/favicon.svg">
+    <link rel="apple-touch-icon" href="/assets/icon-192.png">
+    <link rel="manifest" href="/assets/manifest.json">
+    <link rel="stylesheet" href="/assets/bookshelf.css">
+    <script src="/assets/theme-init.js"></script>
+</head>
+<body>
+    <!-- 加载动画 -->
+    <div class="loading-overlay" id="loadingOverlay">
+        <div class="loading-spinner"></div>
+    </div>
+
+<div class="top-controls">
+    <div class="theme-toggle" id="themeToggle">
+        <i class="fas fa-moon"></i>
+        <span class="control-name">Theme</span>
+    </div>
+</div>
+"""
+
+_BOOK_INDEX_MODALS = """<!-- 书架弹窗 -->
+<div class="bookshelf-modal" id="bookshelfModal">
+    <div class="bookshelf-content">
+        <div class="bookshelf-header">
+            <div class="bookshelf-header-left">
+                <button class="bookshelf-action-btn" id="addShelfGroupBtn">
+                    <i class="fas fa-folder-plus"></i> Add Group
+                </button>
+                <button class="bookshelf-action-btn" id="syncShelfBtn">
+                    <i class="fas fa-sync"></i> Sync
+                </button>
+                <button class="bookshelf-action-btn" id="exportShelfBtn">
+                    <i class="fas fa-upload"></i> Export
+                </button>
+                <button class="bookshelf-action-btn" id="importShelfBtn">
+                    <i class="fas fa-download"></i> Import
+                </button>
+                <input type="file" id="importShelfFile" accept=".json" style="display: none;">
+            </div>
+            <h2 class="bookshelf-title"><i class="fas fa-home"></i> Bookshelf</h2>
+            <div class="bookshelf-header-right">
+                <button class="bookshelf-close-btn" id="bookshelfCloseBtn">
+                    <i class="fas fa-times"></i>
+                </button>
+            </div>
+        </div>
+        <div class="bookshelf-tag-filter" id="bookshelfTagFilter">
+            <span class="bookshelf-tag active" data-tag="All">All</span>
+        </div>
+        <div class="bookshelf-loading" id="bookshelfLoading">
+            <div class="loading-spinner"></div>
+        </div>
+        <div class="bookshelf-body" id="bookshelfBody">
+        </div>
+        <div class="bookshelf-footer" id="bookshelfFooter">
+            <span id="bookshelfStats"></span>
+        </div>
+    </div>
+</div>
+
+<!-- 分组弹窗 -->
+<div class="bookshelf-modal" id="groupModal">
+    <div class="bookshelf-content">
+        <div class="bookshelf-header">
+            <div class="bookshelf-header-left">
+                <button class="bookshelf-action-btn" id="addGroupSubGroupBtn">
+                    <i class="fas fa-folder-plus"></i> Add Group
+                </button>
+                <button class="bookshelf-action-btn" id="renameGroupBtn">
+                    <i class="fas fa-edit"></i> Rename
+                </button>
+                <button class="bookshelf-action-btn bookshelf-delete-btn" id="deleteGroupBtn">
+                    <i class="fas fa-trash"></i> Delete Group
+                </button>
+            </div>
+            <h2 class="bookshelf-title" id="groupModalTitle">Group</h2>
+            <div class="bookshelf-header-right">
+                <button class="bookshelf-close-btn" id="groupCloseBtn">
+                    <i class="fas fa-home"></i>
+                </button>
+                <button class="bookshelf-close-btn" id="groupCloseAllBtn">
+                    <i class="fas fa-times"></i>
+                </button>
+            </div>
+        </div>
+        <div class="bookshelf-tag-filter" id="groupTagFilter">
+            <span class="bookshelf-tag active" data-tag="All">All</span>
+        </div>
+        <div class="bookshelf-loading" id="groupLoading">
+            <div class="loading-spinner"></div>
+        </div>
+        <div class="bookshelf-body" id="groupBody">
+        </div>
+        <div class="bookshelf-footer" id="groupFooter">
+            <span id="groupStats"></span>
+        </div>
+    </div>
+</div>
+"""
+
+_BOOK_INDEX_SCRIPTS = """
+<script src="/assets/theme.js" defer></script>
+<script src="/assets/book.js" defer></script>
+<script src="/assets/bookshelf.js" defer></script>
+<script src="/assets/sortable.min.js" defer></script>
+<script>
+function addBasePath(basePath) {
+    // 处理所有链接、图片和样式表
+    const resources = document.querySelectorAll('a[href^="/"], script[src^="/"], img[src^="/"], link[href^="/"]');
+    resources.forEach(resource => {
+        const src = resource.getAttribute('src');
+        const href = resource.getAttribute('href');
+        if (src && !src.startsWith('http') && !src.startsWith('//') && !src.startsWith(basePath)) {
+            resource.setAttribute('src', basePath.substr(0, basePath.length - 1) + src);
+        }
+        if (href && !href.startsWith('http') && !href.startsWith('//') && !href.startsWith(basePath)) {
+            resource.setAttribute('href', basePath.substr(0, basePath.length - 1) + href);
+        }
+    });
+}
+
+// 检查当前的基路径
+let path = window.location.pathname;
+let basePath = path.split('/book/');
+// 获取基路径
+basePath = basePath[0] + "/";
+// 检查当前的基路径
+if (!path.startsWith("/book/")) {
+    // 处理所有资源，都要加上基路径
+    addBasePath(basePath);
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+// 检查当前的基路径
+let path = window.location.pathname;
+let basePath = path.split('/book/');
+// 获取基路径
+basePath = basePath[0] + "/";
+
+// 单独处理 js 资源，无论如何都要重新加载，因为那个脚本不再监听 DOMContentLoaded 事件了
+const js_resource = document.querySelector('script[src="/assets/book.js"]');
+if (window.initScriptBook && window.initTheme) {
+    console.log("init")
+    window.initScriptBook();
+} else {
+    const src = js_resource.getAttribute('src');
+    newScript = reloadScriptByReplacement(js_resource, basePath.substr(0, basePath.length - 1) + src);
+    newScript.onload = () => {
+        if (window.initScriptBook && window.initTheme) {
+            console.log("reinit")
+            window.initScriptBook();
+        }
+    };
+}
+
+function reloadScriptByReplacement(scriptElement, newSrc) {
+    const newScript = document.createElement('script');
+    newScript.src = newSrc;
+
+    // 复制原script的所有属性（除了src）
+    Array.from(scriptElement.attributes).forEach(attr => {
+        if (attr.name !== 'src') {
+            newScript.setAttribute(attr.name, attr.value);
+        }
+    });
+    scriptElement.parentNode.replaceChild(newScript, scriptElement);
+    return newScript;
+}
+});
+</script>
+</body>
+</html>"""
+
+# kindle 支持，不能压缩 css 和 js
+_BOOK_INDEX_HEAD_MIN = minify_html.minify(_BOOK_INDEX_HEAD, minify_css=False, minify_js=False)
+_BOOK_INDEX_MODALS_MIN = minify_html.minify(_BOOK_INDEX_MODALS, minify_css=False, minify_js=False)
+_BOOK_INDEX_SCRIPTS_MIN = minify_html.minify(_BOOK_INDEX_SCRIPTS, minify_css=False, minify_js=False)
+
 class EPUBProcessor:
     """处理EPUB文件的类"""
     
@@ -41,10 +289,25 @@ class EPUBProcessor:
         self.lang = 'en'
         self.chapters = []
         self.toc = []  # 存储目录结构
+        # toc 的三张查找表（src / basename / normpath），parse_opf 中填充
+        self._toc_by_src = {}
+        self._toc_by_basename = {}
+        self._toc_by_norm = {}
         self.resources_base = "resources"  # 资源文件的基础路径
-    
+        self._zf = None  # 长期持有的 ZipFile 句柄，贯穿解压和解析阶段
+
+    def close(self):
+        """关闭打开的 ZIP 句柄"""
+        if self._zf is not None:
+            try:
+                self._zf.close()
+            except Exception:
+                pass
+            self._zf = None
+
     def cleanup(self):
         # 诸如 extract 失败
+        self.close()
         try:
             if os.path.exists(self.temp_dir):
                 shutil.rmtree(self.temp_dir, ignore_errors=True)
@@ -85,11 +348,93 @@ class EPUBProcessor:
                 except Exception as e:
                     print(f"Modify directory name failed, old: {self.temp_dir}, new: {new_temp_dir}, err: {e}")
         
+    def _collect_needed_members(self, zf):
+        """从 ZIP 中直接读出 container.xml 和 OPF，算出 manifest 实际引用的成员
+
+        读取走内存，不落盘；任何一步解析不了就返回 None，由调用方回退到全量解压。
+        """
+        try:
+            names = set(zf.namelist())
+            container_name = 'META-INF/container.xml'
+            if container_name not in names:
+                return None
+            root = XET.fromstring(zf.read(container_name), _XML_PARSER)
+            rootfile = root.find('.//ns:rootfile', CONTAINER_NS)
+            if rootfile is None:
+                return None
+            opf_name = rootfile.get('full-path')
+            if not opf_name or opf_name not in names:
+                return None
+
+            opf_root = XET.fromstring(zf.read(opf_name), _XML_PARSER)
+            opf_dir = posixpath.dirname(opf_name)
+            needed = {container_name, opf_name}
+            # META-INF 下的其他文件（加密、签名等）一并保留
+            needed.update(n for n in names if n.startswith('META-INF/'))
+            has_ncx = False
+            for item in opf_root.findall('.//opf:item', OPF_NS):
+                href = item.get('href')
+                if not href:
+                    continue
+                member = posixpath.normpath(posixpath.join(opf_dir, urllib.parse.unquote(href)))
+                if member in names:
+                    needed.add(member)
+                    if member.endswith('.ncx') or item.get('media-type') == 'application/x-dtbncx+xml':
+                        has_ncx = True
+            if len(needed) <= 2:
+                # manifest 没解析出任何资源，宁可全量解压
+                return None
+            if not has_ncx:
+                # manifest 连 NCX 都没声明的书往往整体不规范，章节引用的资源
+                # 也可能未声明；交回全量解压，find_ncx_file 的磁盘探测
+                # （toc.ncx/nav.ncx/ncx.ncx）和 copy_resources 的目录遍历
+                # 兜底才有东西可用
+                return None
+            # manifest 之外的 .ncx 成员一并保留，磁盘探测的兜底不受按需解压影响
+            needed.update(n for n in names if n.endswith('.ncx'))
+            return sorted(needed)
+        except Exception:
+            return None
+
+    def _extract_members(self, zf, members):
+        """流式解压指定成员（None 表示全部）
+
+        extractall 对每个成员都走 ZipExtFile 的默认小缓冲和重复的元数据
+        检查；这里直接 zf.open + copyfileobj，缓冲取 min(文件大小, 1MiB)，
+        大文件整块搬运，小文件不浪费内存。路径统一规范化，防止 zip-slip。
+        """
+        extract_root = os.path.abspath(self.extract_dir)
+        if members is None:
+            members = zf.namelist()
+        for name in members:
+            dest = os.path.abspath(os.path.join(extract_root, *name.split('/')))
+            if not dest.startswith(extract_root + os.sep):
+                # 越出解压目录的恶意路径，直接跳过
+                continue
+            if name.endswith('/'):
+                os.makedirs(dest, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            info = zf.getinfo(name)
+            if info.file_size == 0:
+                # 零字节成员只需创建空文件
+                open(dest, 'wb').close()
+                continue
+            with zf.open(info) as src, open(dest, 'wb') as dst:
+                shutil.copyfileobj(src, dst, min(info.file_size, 1 << 20))
+
     def extract_epub(self):
-        """解压EPUB文件"""
+        """解压EPUB文件
+
+        只解压 manifest 引用到的成员（container/OPF 先在内存里解析），
+        磁盘写入量从 O(全部条目) 降到 O(被引用文件)；ZIP 句柄保持打开，
+        供后续阶段复用，由 cleanup/close 关闭。
+        """
         try:
-            with zipfile.ZipFile(self.epub_path, 'r') as zip_ref:
-                zip_ref.extractall(self.extract_dir)
+            zf = zipfile.ZipFile(self.epub_path, 'r')
+            self._zf = zf
+            members = self._collect_needed_members(zf)
+            self._extract_members(zf, members)
             # print(f"EPUB file extracted to: {self.extract_dir}")
             return True
         except Exception as e:
@@ -104,11 +449,10 @@ class EPUBProcessor:
             return None
             
         try:
-            tree = ET.parse(container_path)
+            tree = XET.parse(container_path, _XML_PARSER)
             root = tree.getroot()
             # 查找rootfile元素
-            ns = {'ns': 'urn:oasis:names:tc:opendocument:xmlns:container'}
-            rootfile = root.find('.//ns:rootfile', ns)
+            rootfile = root.find('.//ns:rootfile', CONTAINER_NS)
             if rootfile is not None:
                 return rootfile.get('full-path')
         except Exception as e:
@@ -116,165 +460,143 @@ class EPUBProcessor:
             
         return None
     
-    def find_cover_info(self, opf_tree, namespaces):
+    def find_cover_info(self, meta_items, manifest_items):
         """
         在 OPF 文件中查找封面信息
+
+        meta_items / manifest_items 由 parse_opf 单次遍历收集好传入，
+        这里不再对树做任何 XPath 扫描。
         """
         # 方法1: 查找 meta 标签中声明的封面
         cover_id = None
-        meta_elements = opf_tree.findall('.//opf:metadata/opf:meta', namespaces)
-        for meta in meta_elements:
+        for meta in meta_items:
             if meta.get('name') in ['cover', 'cover-image']:
                 cover_id = meta.get('content')
                 break
-        
-        # 方法2: 查找 manifest 中的封面项
-        manifest_items = opf_tree.findall('.//opf:manifest/opf:item', namespaces)
-        
-        # 优先使用 meta 标签中指定的封面
-        if cover_id:
-            for item in manifest_items:
-                if item.get('id') == cover_id:
-                    return {
-                        'href': item.get('href'),
-                        'media-type': item.get('media-type'),
-                        'id': item.get('id')
-                    }
-        
-        # 方法3: 通过文件名模式查找
-        cover_patterns = ['cover', 'Cover', 'COVER', 'titlepage', 'TitlePage']
-        for item in manifest_items:
-            media_type = item.get('media-type', '')
-            href = item.get('href', '')
-            
-            # 检查是否是图片文件
-            if media_type.startswith('image/'):
-                # 检查文件名是否匹配封面模式
-                if any(pattern in href for pattern in cover_patterns):
-                    return {
-                        'href': href,
-                        'media-type': media_type,
-                        'id': item.get('id')
-                    }
-        
-        # 方法4: 查找第一个图片作为备选
+
+        # 方法2/3/4 合并为一次遍历：meta 指定的封面命中即返回，
+        # 同时记下首个文件名匹配封面模式的图片与首个图片作为降级备选
+        by_pattern = None
+        first_image = None
         for item in manifest_items:
-            media_type = item.get('media-type', '')
-            if media_type.startswith('image/'):
+            if cover_id and item.get('id') == cover_id:
                 return {
                     'href': item.get('href'),
-                    'media-type': media_type,
+                    'media-type': item.get('media-type'),
                     'id': item.get('id')
                 }
-        
+            media_type = item.get('media-type', '')
+            if not media_type.startswith('image/'):
+                continue
+            if by_pattern is None and _COVER_RE.search(item.get('href', '')):
+                by_pattern = item
+            elif first_image is None:
+                first_image = item
+
+        fallback = by_pattern if by_pattern is not None else first_image
+        if fallback is not None:
+            return {
+                'href': fallback.get('href'),
+                'media-type': fallback.get('media-type', ''),
+                'id': fallback.get('id')
+            }
+
         return None
 
-    def find_ncx_file(self, opf_path, manifest):
-        """查找NCX文件路径"""
+    def find_ncx_file(self, opf_path, manifest, opf_root=None):
+        """查找NCX文件路径
+
+        opf_root 传入 parse_opf 已解析好的根节点时可避免重新解析 OPF。
+        """
         opf_dir = os.path.dirname(opf_path)
-        
+        ext = self.extract_dir
+        join = os.path.join
+        exists = os.path.exists
+
         # 首先查找OPF中明确指定的toc
         try:
-            tree = ET.parse(os.path.join(self.extract_dir, opf_path))
-            root = tree.getroot()
-            ns = {'opf': 'http://www.idpf.org/2007/opf'}
-            
-            spine = root.find('.//opf:spine', ns)
+            if opf_root is None:
+                opf_root = XET.parse(join(ext, opf_path), _XML_PARSER).getroot()
+            spine = opf_root.find('.//opf:spine', OPF_NS)
             if spine is not None:
                 toc_id = spine.get('toc')
                 if toc_id and toc_id in manifest:
-                    ncx_path = os.path.join(opf_dir, manifest[toc_id]['href'])
-                    if os.path.exists(os.path.join(self.extract_dir, ncx_path)):
+                    ncx_path = join(opf_dir, manifest[toc_id]['href'])
+                    if exists(join(ext, ncx_path)):
                         return ncx_path
         except Exception as e:
             print(f"Failed to find toc attribute: {e}")
-        
+
         # 如果没有明确指定，查找media-type为application/x-dtbncx+xml的文件
         for item_id, item in manifest.items():
             if item['media_type'] == 'application/x-dtbncx+xml':
-                ncx_path = os.path.join(opf_dir, item['href'])
-                if os.path.exists(os.path.join(self.extract_dir, ncx_path)):
+                ncx_path = join(opf_dir, item['href'])
+                if exists(join(ext, ncx_path)):
                     return ncx_path
-        
+
         # 最后，尝试查找常见的NCX文件名
         common_ncx_names = ['toc.ncx', 'nav.ncx', 'ncx.ncx']
         for name in common_ncx_names:
-            ncx_path = os.path.join(opf_dir, name)
-            if os.path.exists(os.path.join(self.extract_dir, ncx_path)):
+            ncx_path = join(opf_dir, name)
+            if exists(join(ext, ncx_path)):
                 return ncx_path
         
         return None
     
     def parse_ncx(self, ncx_path):
-        """解析NCX文件获取目录结构"""
+        """解析NCX文件获取目录结构
+
+        iterparse 流式解析：navPoint 的 end 事件到达时其子树刚好解析完，
+        取完数据立即 clear()，峰值内存只和嵌套深度相关；start/end 的配对
+        天然给出层级，不再需要递归也不用反复 findall 整棵子树。
+        条目在 start 时就按文档顺序占位，输出保持原来的先序。
+        """
         ncx_full_path = os.path.join(self.extract_dir, ncx_path)
         if not os.path.exists(ncx_full_path):
             print(f"NCX file not found: {ncx_full_path}")
             return []
-            
+
         try:
-            # 注册命名空间
-            ET.register_namespace('', 'http://www.daisy.org/z3986/2005/ncx/')
-            
-            tree = ET.parse(ncx_full_path)
-            root = tree.getroot()
-            
-            # 获取书籍标题（这一步应该在 opf 文件解析那里做）
-            # doc_title = root.find('.//{http://www.daisy.org/z3986/2005/ncx/}docTitle/{http://www.daisy.org/z3986/2005/ncx/}text')
-            # if doc_title is not None and doc_title.text:
-            #     self.book_title = doc_title.text
-            
-            # 解析目录
-            nav_map = root.find('.//{http://www.daisy.org/z3986/2005/ncx/}navMap')
-            if nav_map is None:
-                return []
-            
+            ncx_dir = os.path.dirname(ncx_path)
             toc = []
-            
-            # 递归处理navPoint
-            def process_navpoint(navpoint, level=0):
-                # 获取导航标签和内容源
-                nav_label = navpoint.find('.//{http://www.daisy.org/z3986/2005/ncx/}navLabel/{http://www.daisy.org/z3986/2005/ncx/}text')
-                content = navpoint.find('.//{http://www.daisy.org/z3986/2005/ncx/}content')
-                
-                if nav_label is not None and content is not None:
-                    title = nav_label.text
-                    src = content.get('src')
-                    anchor = None
-                    
-                    # 处理可能的锚点
-                    if '#' in src:
-                        anchor = src.split('#')[1]
-                        src = src.split('#')[0]
-                    
-                    if title and src:
-                        # 将src路径转换为相对于EPUB根目录的完整路径
-                        ncx_dir = os.path.dirname(ncx_path)
-                        full_src = os.path.normpath(os.path.join(ncx_dir, src))
-                        toc_item = {
-                            'title': title,
-                            'src': full_src,
-                            'level': level
-                        }
+            open_points = []  # 尚未闭合的 navPoint 对应的待填充条目（栈）
+            for event, elem in _iterparse(ncx_full_path):
+                tag = elem.tag
+                if event == 'start':
+                    if tag == NCX_NAVPOINT:
+                        entry = {'title': None, 'src': None, 'level': len(open_points)}
+                        open_points.append(entry)
+                        toc.append(entry)
+                    continue
+                if not open_points:
+                    # navMap 之外的 text/content（docTitle、pageList 等）不关心
+                    continue
+                if tag == NCX_TEXT:
+                    # navPoint 内的 text 只出现在 navLabel 里，归最内层条目
+                    if open_points[-1]['title'] is None:
+                        open_points[-1]['title'] = elem.text
+                elif tag == NCX_CONTENT:
+                    if open_points[-1]['src'] is None:
+                        open_points[-1]['src'] = elem.get('src')
+                elif tag == NCX_NAVPOINT:
+                    entry = open_points.pop()
+                    src = entry['src']
+                    if entry['title'] and src:
                         # 处理可能的锚点
+                        src, _, anchor = src.partition('#')
+                        # 将src路径转换为相对于EPUB根目录的完整路径
+                        entry['src'] = _fast_join_norm(ncx_dir, src)
                         if anchor:
-                            toc_item['anchor'] = anchor
-                        toc_item['old_file_name'] = os.path.basename(src) # 老旧的文件名，只取名字
-                        toc.append(toc_item)
-                
-                # 处理子navPoint
-                child_navpoints = navpoint.findall('{http://www.daisy.org/z3986/2005/ncx/}navPoint')
-                for child in child_navpoints:
-                    process_navpoint(child, level + 1)
-            
-            # 处理所有顶级navPoint
-            top_navpoints = nav_map.findall('{http://www.daisy.org/z3986/2005/ncx/}navPoint')
-            for navpoint in top_navpoints:
-                process_navpoint(navpoint, 0)
-            
+                            entry['anchor'] = anchor
+                        entry['old_file_name'] = os.path.basename(src) # 老旧的文件名，只取名字
+                    else:
+                        # 缺标题或链接的 navPoint，稍后统一过滤
+                        entry['src'] = None
+                    elem.clear()
+
             # print(f"Parsed NCX table of contents items: {[(t['title'], t['src']) for t in toc]}")
-            return toc
-            
+            return [t for t in toc if t['src'] is not None]
+
         except Exception as e:
             print(f"Failed to parse NCX file: {e}")
             import traceback
@@ -289,66 +611,104 @@ class EPUBProcessor:
             return False
             
         try:
-            tree = ET.parse(opf_full_path)
+            tree = XET.parse(opf_full_path, _XML_PARSER)
             root = tree.getroot()
-            
-            # 获取命名空间
-            ns = {'opf': 'http://www.idpf.org/2007/opf',
-                  'dc': 'http://purl.org/dc/elements/1.1/'}
-            
+
+            # 一次 iter() 遍历按标签分发，取代原先对同一棵树的多趟 .// 子树扫描
+            # （书名/作者/标签/描述/语言/manifest/meta/spine 各一趟）
+            title_elem = None
+            description_elem = None
+            lang_elem = None
+            authors = []
+            tags = []
+            meta_items = []
+            manifest_items = []
+            spine = None
+            for elem in root.iter():
+                tag = elem.tag
+                if tag == OPF_ITEM:
+                    manifest_items.append(elem)
+                elif tag == DC_CREATOR:
+                    authors.append(elem)
+                elif tag == DC_SUBJECT:
+                    tags.append(elem)
+                elif tag == OPF_META:
+                    meta_items.append(elem)
+                elif tag == DC_TITLE:
+                    if title_elem is None:
+                        title_elem = elem
+                elif tag == DC_DESCRIPTION:
+                    if description_elem is None:
+                        description_elem = elem
+                elif tag == DC_LANGUAGE:
+                    if lang_elem is None:
+                        lang_elem = elem
+                elif tag == OPF_SPINE:
+                    if spine is None:
+                        spine = elem
+
             # 获取书名
-            title_elem = root.find('.//dc:title', ns)
             if title_elem is not None and title_elem.text:
                 self.book_title = title_elem.text
-            
+
             # 获取作者名
-            authors = tree.findall('.//dc:creator', ns)
             self.authors = [author.text for author in authors] if authors else None
 
             # 获取标签
-            tags = tree.findall('.//dc:subject', ns)
             self.tags = [tag.text for tag in tags] if tags else None
 
             # 获取描述
-            description = tree.find('.//dc:description', ns)
-            self.description = description.text if description is not None and description.text else None
+            self.description = description_elem.text if description_elem is not None and description_elem.text else None
 
             # 获取语言
-            lang = root.find('.//dc:language', ns)
-            self.lang = lang.text if lang is not None and lang.text else 'en'
-                
+            self.lang = lang_elem.text if lang_elem is not None and lang_elem.text else 'en'
+
             # 获取manifest（所有资源）
             manifest = {}
             opf_dir = os.path.dirname(opf_path)
             # 获取封面
-            cover_info = self.find_cover_info(tree, ns)
+            cover_info = self.find_cover_info(meta_items, manifest_items)
             if cover_info:
                 href = cover_info["href"]
-                cover_info["full_path"] = os.path.normpath(os.path.join(opf_dir, href)) if href else None
+                cover_info["full_path"] = _fast_join_norm(opf_dir, href) if href else None
             self.cover_info = cover_info
             # 获取其他资源 xhtml、font、css 等
-            for item in root.findall('.//opf:item', ns):
+            for item in manifest_items:
                 item_id = item.get('id')
                 href = item.get('href')
                 media_type = item.get('media-type', '')
                 # 构建相对于EPUB根目录的完整路径
-                full_path = os.path.normpath(os.path.join(opf_dir, href)) if href else None
+                full_path = _fast_join_norm(opf_dir, href) if href else None
                 manifest[item_id] = {
                     'href': href,
                     'media_type': media_type,
                     'full_path': full_path
                 }
-            
-            # 查找并解析NCX文件
-            ncx_path = self.find_ncx_file(opf_path, manifest)
+
+            # 查找并解析NCX文件（复用已解析的 OPF 根节点，避免二次解析）
+            ncx_path = self.find_ncx_file(opf_path, manifest, root)
             if ncx_path:
                 self.toc = self.parse_ncx(ncx_path)
                 # print(f"Found {len(self.toc)} table of contents items from NCX file")
+
+            # 预建三张查找表，find_chapter_title 由逐章线性扫描降为 O(1)；
+            # setdefault 保留首个同名条目，与原先“取第一个匹配”的语义一致
+            toc_by_src = {}
+            toc_by_basename = {}
+            toc_by_norm = {}
+            for toc_item in self.toc:
+                src = toc_item['src']
+                title = toc_item['title']
+                toc_by_src.setdefault(src, title)
+                toc_by_basename.setdefault(os.path.basename(src), title)
+                toc_by_norm.setdefault(os.path.normpath(src), title)
+            self._toc_by_src = toc_by_src
+            self._toc_by_basename = toc_by_basename
+            self._toc_by_norm = toc_by_norm
             
-            # 获取spine（阅读顺序）
-            spine = root.find('.//opf:spine', ns)
+            # 获取spine（阅读顺序），遍历时已收集
             if spine is not None:
-                for itemref in spine.findall('opf:itemref', ns):
+                for itemref in spine.findall('opf:itemref', OPF_NS):
                     idref = itemref.get('idref')
                     if idref in manifest:
                         item = manifest[idref]
@@ -374,24 +734,20 @@ class EPUBProcessor:
     def find_chapter_title(self, chapter_path):
         """根据章节路径在toc中查找对应的标题"""
         # 先尝试精确匹配
-        for toc_item in self.toc:
-            if toc_item['src'] == chapter_path:
-                return toc_item['title']
-        
+        title = self._toc_by_src.get(chapter_path)
+        if title is not None:
+            return title
+
         # 如果直接匹配失败，尝试基于文件名匹配
-        chapter_filename = os.path.basename(chapter_path)
-        for toc_item in self.toc:
-            toc_filename = os.path.basename(toc_item['src'])
-            if toc_filename == chapter_filename:
-                return toc_item['title']
-        
+        title = self._toc_by_basename.get(os.path.basename(chapter_path))
+        if title is not None:
+            return title
+
         # 尝试规范化路径后再匹配
-        normalized_chapter_path = os.path.normpath(chapter_path)
-        for toc_item in self.toc:
-            normalized_toc_path = os.path.normpath(toc_item['src'])
-            if normalized_toc_path == normalized_chapter_path:
-                return toc_item['title']
-        
+        title = self._toc_by_norm.get(os.path.normpath(chapter_path))
+        if title is not None:
+            return title
+
         # print(f"Chapter title not found: {chapter_path}")
         return None
     
@@ -413,153 +769,33 @@ class EPUBProcessor:
     
     def create_index_page(self):
         """创建章节索引页面"""
-        index_html = f"""<!DOCTYPE html>
-<html lang="{self.lang}">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <meta name="theme-color" content="#4a90d9">
-    <meta name="description" content="{self.book_title} - EPUB Browser">
-    <meta name="apple-mobile-web-app-capable" content="yes">
-    <meta name="apple-mobile-web-app-status-bar-style" content="default">
-    <meta name="apple-mobile-web-app-title" content="EPUB Browser">
-    <title>{self.book_title}</title>
-    <link rel="stylesheet" href="/assets/fa.all.min.css">
-    <link rel="stylesheet" href="/assets/theme.css">
-    <link rel="stylesheet" href="/assets/book.css">
-    <link rel="icon" type="image/svg+xml" href="/assets/favicon.svg">
-    <link rel="apple-touch-icon" href="/assets/icon-192.png">
-    <link rel="manifest" href="/assets/manifest.json">
-    <link rel="stylesheet" href="/assets/bookshelf.css">
-"""
-        index_html += """
-    <script>
-    // 立即应用主题，避免闪现 —— Kindle 兼容版
-    function isKindleDevice() {
-    // 优先从 window 缓存读取
-    if (window.epubBrowserCache && window.epubBrowserCache.kindle_mode !== undefined) {
-        return window.epubBrowserCache.kindle_mode === "true";
-    }
-    // 检测设备
-    var ua = navigator.userAgent.toLowerCase();
-    var isKindle = ua.indexOf("kindle") !== -1 || ua.indexOf("silk") !== -1;
-    
-    if (!window.epubBrowserCache) {
-        window.epubBrowserCache = {};
-    }
-    window.epubBrowserCache.kindle_mode = isKindle ? "true" : "false";
-    return isKindle;
-    }
-
-    // 通用 Cookie 方法（只定义一次）
-    function getCookie(key) {
-    var cookies = document.cookie.split("; ");
-    for (var i = 0; i < cookies.length; i++) {
-        var parts = cookies[i].split("=");
-        var cookieKey = parts[0];
-        var cookieValue = parts.slice(1).join("=");
-        if (cookieKey === key) {
-        return decodeURIComponent(cookieValue);
-        }
-    }
-    return null;
-    }
-
-    var theme = "light";
-    var isKindle = false;
-
-    try {
-    // 优先从 window 缓存读取
-    var storedTheme = null;
-    if (window.epubBrowserCache && window.epubBrowserCache.theme) {
-        storedTheme = window.epubBrowserCache.theme;
-    } else {
-        storedTheme = localStorage.getItem("theme");
-        if (storedTheme) {
-        if (!window.epubBrowserCache) {
-            window.epubBrowserCache = {};
-        }
-        window.epubBrowserCache.theme = storedTheme;
-        }
-    }
-
-    if (storedTheme) {
-        theme = storedTheme;
-    } else if (isKindleDevice()) {
-        isKindle = true;
-        theme = getCookie("theme") || "light";
-    }
-    } catch (e) {
-    // 捕获异常，兼容 Kindle
-    if (isKindleDevice()) {
-        isKindle = true;
-        theme = getCookie("theme") || "light";
-    }
-    }
-
-    // 使用 html 元素添加类名
-    var htmlElement = document.documentElement;
-    htmlElement.classList.add(theme + "-mode");
-    if (isKindle) {
-    htmlElement.classList.add("kindle-mode");
-    }
-    </script>
-</head>
-<body>
-    <!-- 加载动画 -->
-    <div class="loading-overlay" id="loadingOverlay">
-        <div class="loading-spinner"></div>
-    </div>
-
-<div class="top-controls">
-    <div class="theme-toggle" id="themeToggle">
-        <i class="fas fa-moon"></i>
-        <span class="control-name">Theme</span>
-    </div>
-</div>
-"""
-        index_html += f"""
-<div class="container">
-    <div class="breadcrumb eb-header" data-id="breadcrumb">
-        <a href="/index.html#{self.book_hash}"><i class="fas fa-home"></i><span style="margin-left: 8px;">Home</span></a>
-        <span class="breadcrumb-separator">/</span>
-        <span class="breadcrumb-current" id="book_home">{self.book_title}</span>
-    </div>
-
-    <div class="book-info-card" data-id="book-info-card">
-            <div class="book-info-cover">
-                <img src="{self.get_book_info()['cover']}" alt="cover">
-            </div>
-            <div class="book-info-content">
-                <h2 class="book-info-title">{self.book_title}</h2>
-                <p class="book-info-author">{" & ".join(self.authors) if self.authors else "Unknown"}</p>"""
+        index_html = _BOOK_INDEX_HEAD_MIN.format(lang=self.lang, title=self.book_title)
+        index_html += (
+            f'<div class="container"><div class="breadcrumb eb-header" data-id="breadcrumb">'
+            f'<a href="/index.html#{self.book_hash}"><i class="fas fa-home"></i><span style="margin-left: 8px;">Home</span></a>'
+            f'<span class="breadcrumb-separator">/</span>'
+            f'<span class="breadcrumb-current" id="book_home">{self.book_title}</span></div>'
+            f'<div class="book-info-card" data-id="book-info-card">'
+            f'<div class="book-info-cover"><img src="{self.get_book_info()["cover"]}" alt="cover"></div>'
+            f'<div class="book-info-content"><h2 class="book-info-title">{self.book_title}</h2>'
+            f'<p class="book-info-author">{" & ".join(self.authors) if self.authors else "Unknown"}</p>'
+        )
         if self.description:
-            index_html += f""" 
-                <div class="book-info-desc">
-                    {self.description}
-                </div>"""
-        index_html += """
-                <div class="book-info-tags">"""
+            index_html += f'<div class="book-info-desc">{self.description}</div>'
+        index_html += '<div class="book-info-tags">'
         if self.tags:
             for tag in self.tags:
-                index_html += f"""<span class="book-tag">{tag}</span>"""        
-        index_html += f"""
-                </div>
-                <div class="css-controls clearReadingProgress">
-                    <button class="css-btn primary" id="toggleShelfBtn"><i class="fas fa-bookmark"></i><span id="toggleShelfBtnText">Add to Shelf</span></button>
-                    <button class="css-btn primary" id="clearReadingProgressBtn"><i class="fas fa-eraser"></i>Clear reading progress</button>
-                </div>
-            </div>
-        </div>
-    
-    <div class="toc-container" data-id="toc-container">
-        <div class="toc-header">
-            <h2>Table of contents</h2>
-            <div class="chapter-count">total: {len(self.chapters)}</div>
-        </div>
-        <ul class="chapter-list">
-"""
-        
+                index_html += f'<span class="book-tag">{tag}</span>'
+        index_html += (
+            '</div><div class="css-controls clearReadingProgress">'
+            '<button class="css-btn primary" id="toggleShelfBtn"><i class="fas fa-bookmark"></i><span id="toggleShelfBtnText">Add to Shelf</span></button>'
+            '<button class="css-btn primary" id="clearReadingProgressBtn"><i class="fas fa-eraser"></i>Clear reading progress</button>'
+            '</div></div></div>'
+            f'<div class="toc-container" data-id="toc-container"><div class="toc-header">'
+            f'<h2>Table of contents</h2><div class="chapter-count">total: {len(self.chapters)}</div></div>'
+            '<ul class="chapter-list">\n'
+        )
+
         # 如果有详细的toc信息，使用toc生成目录
         if self.toc:
             chapter_index_map, chapter_filename_map = self._build_chapter_index_maps()
@@ -585,181 +821,20 @@ class EPUBProcessor:
             for i, chapter in enumerate(self.chapters):
                 index_html += f'        <li><a class="chapter-link" href="/book/{self.book_hash}/chapter_{i}.html" id="eb_ci_{i}">{chapter["title"]}</a></li>\n'
         
-        index_html += f"""    </ul>
-    </div>
-</div>
-<div class="reading-controls" data-id="reading-controls">
-    <div class="control-btn" id="scrollToTopBtn">
-        <i class="fas fa-arrow-up"></i>
-        <span class="control-name">Top</span>
-    </div>
-    <button class="control-btn" id="bookshelfBtn" style="display: none;">
-        <i class="fas fa-bookmark"></i>
-        <span class="control-name">Shelf</span>
-    </button>
-    <a href="/index.html#{self.book_hash}" alt="Home">
-        <div class="control-btn">
-            <i class="fas fa-home"></i>
-            <span class="control-name">Home</span>
-        </div>
-    </a>
-</div>
-<!-- 书架弹窗 -->
-<div class="bookshelf-modal" id="bookshelfModal">
-    <div class="bookshelf-content">
-        <div class="bookshelf-header">
-            <div class="bookshelf-header-left">
-                <button class="bookshelf-action-btn" id="addShelfGroupBtn">
-                    <i class="fas fa-folder-plus"></i> Add Group
-                </button>
-                <button class="bookshelf-action-btn" id="syncShelfBtn">
-                    <i class="fas fa-sync"></i> Sync
-                </button>
-                <button class="bookshelf-action-btn" id="exportShelfBtn">
-                    <i class="fas fa-upload"></i> Export
-                </button>
-                <button class="bookshelf-action-btn" id="importShelfBtn">
-                    <i class="fas fa-download"></i> Import
-                </button>
-                <input type="file" id="importShelfFile" accept=".json" style="display: none;">
-            </div>
-            <h2 class="bookshelf-title"><i class="fas fa-home"></i> Bookshelf</h2>
-            <div class="bookshelf-header-right">
-                <button class="bookshelf-close-btn" id="bookshelfCloseBtn">
-                    <i class="fas fa-times"></i>
-                </button>
-            </div>
-        </div>
-        <div class="bookshelf-tag-filter" id="bookshelfTagFilter">
-            <span class="bookshelf-tag active" data-tag="All">All</span>
-        </div>
-        <div class="bookshelf-loading" id="bookshelfLoading">
-            <div class="loading-spinner"></div>
-        </div>
-        <div class="bookshelf-body" id="bookshelfBody">
-        </div>
-        <div class="bookshelf-footer" id="bookshelfFooter">
-            <span id="bookshelfStats"></span>
-        </div>
-    </div>
-</div>
-
-<!-- 分组弹窗 -->
-<div class="bookshelf-modal" id="groupModal">
-    <div class="bookshelf-content">
-        <div class="bookshelf-header">
-            <div class="bookshelf-header-left">
-                <button class="bookshelf-action-btn" id="addGroupSubGroupBtn">
-                    <i class="fas fa-folder-plus"></i> Add Group
-                </button>
-                <button class="bookshelf-action-btn" id="renameGroupBtn">
-                    <i class="fas fa-edit"></i> Rename
-                </button>
-                <button class="bookshelf-action-btn bookshelf-delete-btn" id="deleteGroupBtn">
-                    <i class="fas fa-trash"></i> Delete Group
-                </button>
-            </div>
-            <h2 class="bookshelf-title" id="groupModalTitle">Group</h2>
-            <div class="bookshelf-header-right">
-                <button class="bookshelf-close-btn" id="groupCloseBtn">
-                    <i class="fas fa-home"></i>
-                </button>
-                <button class="bookshelf-close-btn" id="groupCloseAllBtn">
-                    <i class="fas fa-times"></i>
-                </button>
-            </div>
-        </div>
-        <div class="bookshelf-tag-filter" id="groupTagFilter">
-            <span class="bookshelf-tag active" data-tag="All">All</span>
-        </div>
-        <div class="bookshelf-loading" id="groupLoading">
-            <div class="loading-spinner"></div>
-        </div>
-        <div class="bookshelf-body" id="groupBody">
-        </div>
-        <div class="bookshelf-footer" id="groupFooter">
-            <span id="groupStats"></span>
-        </div>
-    </div>
-</div>
-<footer class="eb-footer" data-id="eb-footer">
-    <p>EPUB Library &copy; {datetime.now().year} | Powered by <a href="https://github.com/dfface/epub-browser" target="_blank">epub-browser</a></p>
-</footer>"""
-
-        index_html += """
-<script src="/assets/theme.js" defer></script>
-<script src="/assets/book.js" defer></script>
-<script src="/assets/bookshelf.js" defer></script>
-<script src="/assets/sortable.min.js" defer></script>
-<script>
-function addBasePath(basePath) {
-    // 处理所有链接、图片和样式表
-    const resources = document.querySelectorAll('a[href^="/"], script[src^="/"], img[src^="/"], link[href^="/"]');
-    resources.forEach(resource => {
-        const src = resource.getAttribute('src');
-        const href = resource.getAttribute('href');
-        if (src && !src.startsWith('http') && !src.startsWith('//') && !src.startsWith(basePath)) {
-            resource.setAttribute('src', basePath.substr(0, basePath.length - 1) + src);
-        }
-        if (href && !href.startsWith('http') && !href.startsWith('//') && !href.startsWith(basePath)) {
-            resource.setAttribute('href', basePath.substr(0, basePath.length - 1) + href);
-        }
-    });
-}
-
-// 检查当前的基路径
-let path = window.location.pathname;
-let basePath = path.split('/book/');
-// 获取基路径
-basePath = basePath[0] + "/";
-// 检查当前的基路径
-if (!path.startsWith("/book/")) {
-    // 处理所有资源，都要加上基路径
-    addBasePath(basePath);
-}
-
-document.addEventListener('DOMContentLoaded', function() {
-// 检查当前的基路径
-let path = window.location.pathname;
-let basePath = path.split('/book/');
-// 获取基路径
-basePath = basePath[0] + "/";
-
-// 单独处理 js 资源，无论如何都要重新加载，因为那个脚本不再监听 DOMContentLoaded 事件了
-const js_resource = document.querySelector('script[src="/assets/book.js"]');
-if (window.initScriptBook && window.initTheme) {
-    console.log("init")
-    window.initScriptBook();
-} else {
-    const src = js_resource.getAttribute('src');
-    newScript = reloadScriptByReplacement(js_resource, basePath.substr(0, basePath.length - 1) + src);
-    newScript.onload = () => {
-        if (window.initScriptBook && window.initTheme) {
-            console.log("reinit")
-            window.initScriptBook();
-        }
-    };
-}
-
-function reloadScriptByReplacement(scriptElement, newSrc) {
-    const newScript = document.createElement('script');
-    newScript.src = newSrc;
-    
-    // 复制原script的所有属性（除了src）
-    Array.from(scriptElement.attributes).forEach(attr => {
-        if (attr.name !== 'src') {
-            newScript.setAttribute(attr.name, attr.value);
-        }
-    });
-    scriptElement.parentNode.replaceChild(newScript, scriptElement);
-    return newScript;
-}
-});
-</script>
-</body>
-</html>"""
-        # kindle 支持，不能压缩 css 和 js
-        index_html = minify_html.minify(index_html, minify_css=False, minify_js=False)
+        index_html += (
+            '</ul></div></div>'
+            '<div class="reading-controls" data-id="reading-controls">'
+            '<div class="control-btn" id="scrollToTopBtn"><i class="fas fa-arrow-up"></i><span class="control-name">Top</span></div>'
+            '<button class="control-btn" id="bookshelfBtn" style="display: none;"><i class="fas fa-bookmark"></i><span class="control-name">Shelf</span></button>'
+            f'<a href="/index.html#{self.book_hash}" alt="Home"><div class="control-btn"><i class="fas fa-home"></i><span class="control-name">Home</span></div></a>'
+            '</div>'
+        )
+        index_html += _BOOK_INDEX_MODALS_MIN
+        index_html += (
+            f'<footer class="eb-footer" data-id="eb-footer"><p>EPUB Library &copy; {datetime.now().year}'
+            ' | Powered by <a href="https://github.com/dfface/epub-browser" target="_blank">epub-browser</a></p></footer>'
+        )
+        index_html += _BOOK_INDEX_SCRIPTS_MIN
         with open(os.path.join(self.web_dir, 'index.html'), 'w', encoding='utf-8') as f:
             f.write(index_html)
         
@@ -1119,77 +1194,7 @@ function reloadScriptByReplacement(scriptElement, newSrc) {
     <link rel="stylesheet" href="/assets/bookshelf.css">
 """
         chapter_html += """
-    <script>
-    // 立即应用主题，避免闪现 —— Kindle 兼容版
-    function isKindleDevice() {
-    // 优先从 window 缓存读取
-    if (window.epubBrowserCache && window.epubBrowserCache.kindle_mode !== undefined) {
-        return window.epubBrowserCache.kindle_mode === "true";
-    }
-    // 检测设备
-    var ua = navigator.userAgent.toLowerCase();
-    var isKindle = ua.indexOf("kindle") !== -1 || ua.indexOf("silk") !== -1;
-    
-    if (!window.epubBrowserCache) {
-        window.epubBrowserCache = {};
-    }
-    window.epubBrowserCache.kindle_mode = isKindle ? "true" : "false";
-    return isKindle;
-    }
-
-    // 通用 Cookie 方法（只定义一次）
-    function getCookie(key) {
-    var cookies = document.cookie.split("; ");
-    for (var i = 0; i < cookies.length; i++) {
-        var parts = cookies[i].split("=");
-        var cookieKey = parts[0];
-        var cookieValue = parts.slice(1).join("=");
-        if (cookieKey === key) {
-        return decodeURIComponent(cookieValue);
-        }
-    }
-    return null;
-    }
-
-    var theme = "light";
-    var isKindle = false;
-
-    try {
-    // 优先从 window 缓存读取
-    var storedTheme = null;
-    if (window.epubBrowserCache && window.epubBrowserCache.theme) {
-        storedTheme = window.epubBrowserCache.theme;
-    } else {
-        storedTheme = localStorage.getItem("theme");
-        if (storedTheme) {
-        if (!window.epubBrowserCache) {
-            window.epubBrowserCache = {};
-        }
-        window.epubBrowserCache.theme = storedTheme;
-        }
-    }
-
-    if (storedTheme) {
-        theme = storedTheme;
-    } else if (isKindleDevice()) {
-        isKindle = true;
-        theme = getCookie("theme") || "light";
-    }
-    } catch (e) {
-    // 捕获异常，兼容 Kindle
-    if (isKindleDevice()) {
-        isKindle = true;
-        theme = getCookie("theme") || "light";
-    }
-    }
-
-    // 使用 html 元素添加类名
-    var htmlElement = document.documentElement;
-    htmlElement.classList.add(theme + "-mode");
-    if (isKindle) {
-    htmlElement.classList.add("kindle-mode");
-    }
-    </script>
+    <script src="/assets/theme-init.js"></script>
 </head>
 """
         chapter_html +=f"""
@@ -1647,7 +1652,13 @@ function reloadScriptByReplacement(scriptElement, newSrc) {
                 
                 # 确保目标目录存在
                 os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-                shutil.copy2(src_path, dst_path)
+                try:
+                    # 源和目标都在 temp_dir 下（同一文件系统），硬链接即可共享
+                    # 同一份数据：不产生数据 IO，后面 rmtree extracted 只减引用计数
+                    os.link(src_path, dst_path)
+                except OSError:
+                    # 跨文件系统或目标已存在等罕见情况，回退到真实拷贝
+                    shutil.copy2(src_path, dst_path)
         
         # 删除原来的 extracted，以后都不用了
         if os.path.exists(self.extract_dir):
@@ -1676,6 +1687,7 @@ function reloadScriptByReplacement(scriptElement, newSrc) {
     
     def cleanup(self):
         """清理临时文件"""
+        self.close()
         if os.path.exists(self.temp_dir):
             shutil.rmtree(self.temp_dir)
             # print(f"Temporary files cleaned up for: {self.book_title}")